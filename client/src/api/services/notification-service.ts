@@ -5,13 +5,22 @@ export interface Notification {
   title: string;
   description: string;
   read: boolean;
+  created_at: string;
 }
+
+export interface NotificationFeed {
+  items: Notification[];
+  unread_count: number;
+  cursor: string | null;
+  has_more: boolean;
+}
+
 class NotificationService {
   async getNotifications(limit?: number): Promise<Notification[]> {
-    const response = await apiClient.get<Notification[]>(
+    const response = await apiClient.get<NotificationFeed>(
       `/notifications${limit ? `?limit=${limit}` : ""}`,
     );
-    return response.data;
+    return response.data.items;
   }
 }
 
@@ -1,6 +1,7 @@
 import { Box, Container, Divider, Typography } from "@mui/material";
 import { useEffect, useState } from "react";
 
+import apiClient from "@/api/client";
 import { useAppDispatch, useAppSelector } from "@/app/hooks";
 
 import LoadingComponent from "@/components/loading";
@@ -23,16 +24,24 @@ function Dashboard() {
   const [websocket, setWebsocket] = useState<WebSocket>();
 
   useEffect(() => {
-    const url = `ws://localhost:8000/api/v1/notifications/ws/${user?.username}`;
-    const ws = new WebSocket(url);
+    const token = localStorage.getItem("access_token");
+    if (!user?.username || !token) {
+      return;
+    }
 
-    ws.onopen = (event) => {
-      ws.send("Connect");
-    };
+    // Browsers can't set headers on WebSockets, the token goes in the query
+    const baseURL = (apiClient.defaults.baseURL ?? "").replace(/^http/, "ws");
+    const url = `${baseURL}/notifications/ws?token=${encodeURIComponent(token)}`;
+    const ws = new WebSocket(url);
 
     // receive message every start page
     ws.onmessage = (e) => {
       const message = JSON.parse(e.data);
+      // The server drops connections that don't answer its pings
+      if (message.type === "ping") {
+        ws.send(JSON.stringify({ type: "pong" }));
+        return;
+      }
       dispatch(addNotification(message));
     };
 
@@ -19,7 +19,7 @@ export interface Availability {
 class AvailabilityService {
   async getReoccurringAvailability() {
     const response = await apiClient.get(`/availability`);
-    return response.data;
+    return response.data.items;
   }
 
   async saveReoccurringAvailability(availabilities: Availability[]) {
@@ -5,12 +5,29 @@ export interface Notification {
   title: string;
   description: string;
   read: boolean;
+  created_at: string;
 }
+
+export interface NotificationFeed {
+  items: Notification[];
+  unread_count: number;
+  cursor: string | null;
+  has_more: boolean;
+}
+
 class NotificationService {
   async getNotifications(limit?: number): Promise<Notification[]> {
-    const response = await apiClient.get<Notification[]>(
+    const response = await apiClient.get<NotificationFeed>(
       `/notifications${limit ? `?limit=${limit}` : ""}`,
     );
+    return response.data.items;
+  }
+
+  async getNotificationsSince(since: string | null): Promise<NotificationFeed> {
+    const response = await apiClient.get<NotificationFeed>(
+      "/notifications/delta",
+      { params: since ? { since } : {} },
+    );
     return response.data;
   }
 }
@@ -71,7 +71,7 @@ class ServicesService {
 
   async getAllServices() {
     const response = await apiClient.get(`/services`);
-    return response.data;
+    return response.data.items;
   }
 
   async deleteService(serviceId: string) {
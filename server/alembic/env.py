@@ -22,6 +22,8 @@ from app.models.service import Service  # noqa
 from app.models.token import Token  # noqa
 from app.models.user import User  # noqa
 from app.models.availability import Availability  # noqa
+from app.models.notification import Notification  # noqa
+from app.models.outbox import OutboxEvent  # noqa
 
 target_metadata = Base.metadata
 
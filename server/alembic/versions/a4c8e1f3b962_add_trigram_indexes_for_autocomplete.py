@@ -0,0 +1,43 @@
+"""add trigram indexes for autocomplete
+
+Revision ID: a4c8e1f3b962
+Revises: f27b9e4a6c10
+Create Date: 2026-10-18 15:02:11.418230
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4c8e1f3b962"
+down_revision: Union[str, None] = "f27b9e4a6c10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGRAM_INDEXES = [
+    ("ix_services_title_trgm", "services", "title"),
+    ("ix_services_category_trgm", "services", "category"),
+    ("ix_services_location_trgm", "services", "location"),
+    ("ix_services_tags_text_trgm", "services_tags", "text"),
+]
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        op.create_index(
+            name,
+            table,
+            [column],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"},
+        )
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(TRIGRAM_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,47 @@
+"""add tags text to services
+
+Revision ID: a7e3c9f1d254
+Revises: f1a3c5e7b920
+Create Date: 2026-10-18 21:12:40.281905
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_searchable import sync_trigger
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7e3c9f1d254"
+down_revision: Union[str, None] = "f1a3c5e7b920"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCHED_COLUMNS = ["title", "description", "category", "location"]
+
+
+def upgrade() -> None:
+    op.add_column("services", sa.Column("tags_text", sa.String(), nullable=True))
+    op.execute(
+        """
+        UPDATE services
+        SET tags_text = tags.text
+        FROM (
+            SELECT service_id, string_agg(text, ' ') AS text
+            FROM services_tags
+            GROUP BY service_id
+        ) AS tags
+        WHERE tags.service_id = services.id
+        """
+    )
+    # Recreates the trigger maintaining search_vector and refreshes every row
+    sync_trigger(
+        op.get_bind(), "services", "search_vector", SEARCHED_COLUMNS + ["tags_text"]
+    )
+
+
+def downgrade() -> None:
+    sync_trigger(op.get_bind(), "services", "search_vector", SEARCHED_COLUMNS)
+    op.drop_column("services", "tags_text")
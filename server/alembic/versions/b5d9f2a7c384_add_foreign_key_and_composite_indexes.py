@@ -0,0 +1,107 @@
+"""add foreign key and composite indexes
+
+Revision ID: b5d9f2a7c384
+Revises: a4c8e1f3b962
+Create Date: 2026-10-18 15:41:37.226914
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b5d9f2a7c384"
+down_revision: Union[str, None] = "a4c8e1f3b962"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep the most recently modified row when a user has several for a day
+    op.execute(
+        """
+        DELETE FROM recurring_availabilities a
+        USING recurring_availabilities b
+        WHERE a.user_id = b.user_id
+          AND a.day = b.day
+          AND (coalesce(a.updated_at, a.created_at), a.id)
+            < (coalesce(b.updated_at, b.created_at), b.id)
+        """
+    )
+    op.create_unique_constraint(
+        "uq_recurring_availabilities_user_id_day",
+        "recurring_availabilities",
+        ["user_id", "day"],
+    )
+
+    op.create_index(
+        "ix_services_provider_id_created_at",
+        "services",
+        ["provider_id", "created_at", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_services_created_at_id", "services", ["created_at", "id"], unique=False
+    )
+    # A B-tree over free text is never used by the full text search
+    op.drop_index(op.f("ix_services_description"), table_name="services")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_services_search_vector "
+        "ON services USING gin (search_vector)"
+    )
+
+    op.create_index(
+        op.f("ix_services_tags_service_id"),
+        "services_tags",
+        ["service_id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_services_media_service_id"),
+        "services_media",
+        ["service_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_bookings_service_id_booking_time_active",
+        "bookings",
+        ["service_id", "booking_time"],
+        unique=False,
+        postgresql_where=sa.text("status <> 'cancelled'"),
+    )
+    op.create_index(
+        "ix_bookings_customer_id_booking_time",
+        "bookings",
+        ["customer_id", "booking_time"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_reviews_booking_id"), "reviews", ["booking_id"], unique=False
+    )
+    op.create_index(op.f("ix_tokens_user_id"), "tokens", ["user_id"], unique=False)
+    op.create_index(
+        "ix_users_created_at_id", "users", ["created_at", "id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_created_at_id", table_name="users")
+    op.drop_index(op.f("ix_tokens_user_id"), table_name="tokens")
+    op.drop_index(op.f("ix_reviews_booking_id"), table_name="reviews")
+    op.drop_index("ix_bookings_customer_id_booking_time", table_name="bookings")
+    op.drop_index("ix_bookings_service_id_booking_time_active", table_name="bookings")
+    op.drop_index(op.f("ix_services_media_service_id"), table_name="services_media")
+    op.drop_index(op.f("ix_services_tags_service_id"), table_name="services_tags")
+    op.create_index(
+        op.f("ix_services_description"), "services", ["description"], unique=False
+    )
+    op.drop_index("ix_services_created_at_id", table_name="services")
+    op.drop_index("ix_services_provider_id_created_at", table_name="services")
+    op.drop_constraint(
+        "uq_recurring_availabilities_user_id_day",
+        "recurring_availabilities",
+        type_="unique",
+    )
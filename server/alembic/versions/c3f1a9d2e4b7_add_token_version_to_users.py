@@ -0,0 +1,30 @@
+"""add token_version to users
+
+Revision ID: c3f1a9d2e4b7
+Revises: b7d26253ddc2
+Create Date: 2026-10-18 12:20:41.118204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c3f1a9d2e4b7"
+down_revision: Union[str, None] = "b7d26253ddc2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("token_version", sa.Integer(), server_default="0", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "token_version")
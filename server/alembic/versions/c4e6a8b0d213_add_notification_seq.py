@@ -0,0 +1,73 @@
+"""add notification seq
+
+Revision ID: c4e6a8b0d213
+Revises: a7e3c9f1d254
+Create Date: 2026-10-18 22:04:17.530648
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e6a8b0d213"
+down_revision: Union[str, None] = "a7e3c9f1d254"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("notification_seq", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column("notifications", sa.Column("seq", sa.Integer(), nullable=True))
+    # Number the existing notifications in their previous cursor order
+    op.execute(
+        """
+        UPDATE notifications
+        SET seq = numbered.seq
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY user_id ORDER BY created_at, id
+            ) AS seq
+            FROM notifications
+        ) AS numbered
+        WHERE numbered.id = notifications.id
+        """
+    )
+    op.execute(
+        """
+        UPDATE users
+        SET notification_seq = last.seq
+        FROM (
+            SELECT user_id, max(seq) AS seq
+            FROM notifications
+            GROUP BY user_id
+        ) AS last
+        WHERE last.user_id = users.id
+        """
+    )
+    op.alter_column("notifications", "seq", nullable=False)
+    op.create_index(
+        "ix_notifications_user_id_seq",
+        "notifications",
+        ["user_id", "seq"],
+        unique=True,
+    )
+    op.drop_index("ix_notifications_user_id_created_at_id", table_name="notifications")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_notifications_user_id_created_at_id",
+        "notifications",
+        ["user_id", "created_at", "id"],
+        unique=False,
+    )
+    op.drop_index("ix_notifications_user_id_seq", table_name="notifications")
+    op.drop_column("notifications", "seq")
+    op.drop_column("users", "notification_seq")
@@ -0,0 +1,64 @@
+"""add booking end_time and overlap constraint
+
+Revision ID: c6e0a3b8d415
+Revises: b5d9f2a7c384
+Create Date: 2026-10-18 16:20:45.093114
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c6e0a3b8d415"
+down_revision: Union[str, None] = "b5d9f2a7c384"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # GiST operator classes for plain equality on the uuid column
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    op.add_column("bookings", sa.Column("provider_id", sa.UUID(), nullable=True))
+    op.add_column("bookings", sa.Column("end_time", sa.DateTime(), nullable=True))
+    op.create_foreign_key(
+        "bookings_provider_id_fkey", "bookings", "users", ["provider_id"], ["id"]
+    )
+
+    # Existing bookings had no duration, they used the 60 minutes default
+    op.execute(
+        """
+        UPDATE bookings
+        SET provider_id = services.provider_id,
+            end_time = bookings.booking_time + interval '60 minutes'
+        FROM services
+        WHERE services.id = bookings.service_id
+        """
+    )
+    op.execute(
+        "UPDATE bookings SET end_time = booking_time + interval '60 minutes' "
+        "WHERE end_time IS NULL"
+    )
+    op.alter_column("bookings", "end_time", nullable=False)
+
+    # Fails if active bookings of a provider already overlap, those have to
+    # be resolved by hand first
+    op.create_exclude_constraint(
+        "ex_bookings_provider_id_time_range",
+        "bookings",
+        ("provider_id", "="),
+        (sa.text("tsrange(booking_time, end_time, '[)')"), "&&"),
+        using="gist",
+        where=sa.text("status <> 'cancelled'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("ex_bookings_provider_id_time_range", "bookings")
+    op.drop_constraint("bookings_provider_id_fkey", "bookings", type_="foreignkey")
+    op.drop_column("bookings", "end_time")
+    op.drop_column("bookings", "provider_id")
@@ -0,0 +1,91 @@
+"""add rating aggregates
+
+Revision ID: d3f7b1c9e286
+Revises: c6e0a3b8d415
+Create Date: 2026-10-18 17:05:12.640381
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d3f7b1c9e286"
+down_revision: Union[str, None] = "c6e0a3b8d415"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RATING_COLUMNS = ["rating_count", "rating_sum"] + [
+    f"rating_{rating}_count" for rating in range(1, 6)
+]
+
+AGGREGATES = """
+    count(*) AS rating_count,
+    sum(reviews.rating) AS rating_sum,
+    count(*) FILTER (WHERE reviews.rating = 1) AS rating_1_count,
+    count(*) FILTER (WHERE reviews.rating = 2) AS rating_2_count,
+    count(*) FILTER (WHERE reviews.rating = 3) AS rating_3_count,
+    count(*) FILTER (WHERE reviews.rating = 4) AS rating_4_count,
+    count(*) FILTER (WHERE reviews.rating = 5) AS rating_5_count
+"""
+
+
+def upgrade() -> None:
+    op.add_column("reviews", sa.Column("service_id", sa.UUID(), nullable=True))
+    op.create_foreign_key(
+        "reviews_service_id_fkey", "reviews", "services", ["service_id"], ["id"]
+    )
+    op.create_index(
+        op.f("ix_reviews_service_id"), "reviews", ["service_id"], unique=False
+    )
+    op.execute(
+        """
+        UPDATE reviews SET service_id = bookings.service_id
+        FROM bookings WHERE bookings.id = reviews.booking_id
+        """
+    )
+
+    for table in ("services", "users"):
+        for column in RATING_COLUMNS:
+            op.add_column(
+                table,
+                sa.Column(column, sa.Integer(), nullable=False, server_default="0"),
+            )
+
+    assignments = ", ".join(f"{column} = totals.{column}" for column in RATING_COLUMNS)
+    op.execute(
+        f"""
+        UPDATE services SET {assignments}
+        FROM (
+            SELECT reviews.service_id, {AGGREGATES}
+            FROM reviews
+            WHERE reviews.rating BETWEEN 1 AND 5
+            GROUP BY reviews.service_id
+        ) AS totals
+        WHERE services.id = totals.service_id
+        """
+    )
+    op.execute(
+        f"""
+        UPDATE users SET {assignments}
+        FROM (
+            SELECT bookings.provider_id, {AGGREGATES}
+            FROM reviews JOIN bookings ON bookings.id = reviews.booking_id
+            WHERE reviews.rating BETWEEN 1 AND 5
+            GROUP BY bookings.provider_id
+        ) AS totals
+        WHERE users.id = totals.provider_id
+        """
+    )
+
+
+def downgrade() -> None:
+    for table in ("users", "services"):
+        for column in reversed(RATING_COLUMNS):
+            op.drop_column(table, column)
+    op.drop_index(op.f("ix_reviews_service_id"), table_name="reviews")
+    op.drop_constraint("reviews_service_id_fkey", "reviews", type_="foreignkey")
+    op.drop_column("reviews", "service_id")
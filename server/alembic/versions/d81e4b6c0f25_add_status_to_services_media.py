@@ -0,0 +1,34 @@
+"""add status to services_media
+
+Revision ID: d81e4b6c0f25
+Revises: c3f1a9d2e4b7
+Create Date: 2026-10-18 12:41:09.530177
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d81e4b6c0f25"
+down_revision: Union[str, None] = "c3f1a9d2e4b7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+media_status = sa.Enum("processing", "ready", "failed", name="mediastatus")
+
+
+def upgrade() -> None:
+    media_status.create(op.get_bind(), checkfirst=True)
+    op.add_column(
+        "services_media",
+        sa.Column("status", media_status, server_default="ready", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("services_media", "status")
+    media_status.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,27 @@
+"""add variants to services_media
+
+Revision ID: e5a7c2d9b813
+Revises: d81e4b6c0f25
+Create Date: 2026-10-18 13:02:27.604415
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a7c2d9b813"
+down_revision: Union[str, None] = "d81e4b6c0f25"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("services_media", sa.Column("variants", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("services_media", "variants")
@@ -0,0 +1,62 @@
+"""add notifications
+
+Revision ID: e8b2c4d6f103
+Revises: d3f7b1c9e286
+Create Date: 2026-10-18 18:21:47.903215
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e8b2c4d6f103"
+down_revision: Union[str, None] = "d3f7b1c9e286"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notifications",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=False),
+        sa.Column("read", sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_notifications_user_id_created_at_id",
+        "notifications",
+        ["user_id", "created_at", "id"],
+        unique=False,
+    )
+    op.add_column(
+        "users",
+        sa.Column(
+            "unread_notification_count",
+            sa.Integer(),
+            server_default="0",
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "unread_notification_count")
+    op.drop_index("ix_notifications_user_id_created_at_id", table_name="notifications")
+    op.drop_table("notifications")
@@ -0,0 +1,36 @@
+"""add content_hash to services_media
+
+Revision ID: f27b9e4a6c10
+Revises: e5a7c2d9b813
+Create Date: 2026-10-18 13:24:52.901376
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f27b9e4a6c10"
+down_revision: Union[str, None] = "e5a7c2d9b813"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "services_media", sa.Column("content_hash", sa.String(64), nullable=True)
+    )
+    op.create_index(
+        op.f("ix_services_media_content_hash"),
+        "services_media",
+        ["content_hash"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_services_media_content_hash"), table_name="services_media")
+    op.drop_column("services_media", "content_hash")
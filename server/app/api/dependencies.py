@@ -1,30 +1,87 @@
-from fastapi import Depends, HTTPException
+import uuid
+
+from fastapi import Depends, HTTPException, Query
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.db.session import get_db
+from app.core.security import principal_cache
+from app.db.session import ThreadpoolSession, get_async_db, get_db
 from app.models.user import User
+from app.schemas.user import CurrentUser
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/sign-in")
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
+async def get_threadpool_db(db: Session = Depends(get_db)):
+    yield ThreadpoolSession(db)
+
+
+# Session of the async routes, an AsyncSession when ASYNC_DATABASE is on
+get_async_session = get_async_db if settings.async_database else get_threadpool_db
+
+credentials_exception = HTTPException(
+    status_code=401, detail="Could not validate credentials"
+)
+
+
+def decode_access_token(token: str) -> tuple[uuid.UUID, int]:
+    """
+    Verifies the token signature and returns the user id and token version
+    it was issued for.
+    """
     try:
         payload = jwt.decode(
             token, settings.secret_key, algorithms=[settings.algorithm]
         )
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=401, detail="Could not validate credentials"
-            )
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Could not validate credentials")
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="Could not validate credentials")
-    return user
+        user_id = uuid.UUID(payload["uid"])
+        token_version = int(payload["ver"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise credentials_exception
+    return user_id, token_version
+
+
+def get_cached_principal(user_id: uuid.UUID, token_version: int) -> CurrentUser | None:
+    principal = principal_cache.get(user_id)
+    if principal is None or principal.token_version < token_version:
+        # Not cached yet, or cached before the version was bumped elsewhere
+        return None
+    if principal.token_version > token_version:
+        raise credentials_exception
+    return principal
+
+
+def cache_principal(user: User | None, token_version: int) -> CurrentUser:
+    if user is None or user.token_version != token_version:
+        raise credentials_exception
+    if not user.is_active:
+        raise HTTPException(status_code=403, detail="Inactive user")
+
+    principal = CurrentUser.model_validate(user)
+    principal_cache.set(user.id, principal)
+    return principal
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_session),
+) -> CurrentUser:
+    user_id, token_version = decode_access_token(token)
+    principal = get_cached_principal(user_id, token_version)
+    if principal is not None:
+        return principal
+    return cache_principal(await db.get(User, user_id), token_version)
+
+
+class PageParams:
+    """Query parameters shared by the cursor paginated list endpoints."""
+
+    def __init__(
+        self,
+        cursor: str | None = None,
+        limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max),
+    ):
+        self.cursor = cursor
+        self.limit = limit
@@ -1,34 +1,137 @@
-from typing import List
-
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.api import dependencies
+from app.core.security import password_hasher
+from app.core.socket import manager
+from app.db.pool import pool_stats
+from app.crud.service import SERVICE_LOADERS
+from app.db.session import engine, async_engine
 from app.models.service import Service as ServiceModel
 from app.models.user import User as UserModel, UserRole
+from app.schemas.pagination import Page
 from app.schemas.service import Service as ServiceSchema
 from app.schemas.user import User as UserSchema
+from app.utils.export import ExportFormat, export_response
+from app.utils.pagination import paginate
 
 router = APIRouter()
 
 
-@router.get("/users", response_model=List[UserSchema])
+@router.get("/users", response_model=Page[UserSchema])
 def list_users(
+    page: dependencies.PageParams = Depends(),
     db: Session = Depends(dependencies.get_db),
     current_user: UserModel = Depends(dependencies.get_current_user),
 ):
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Not authorized")
-    users = db.query(UserModel).all()
-    return users
+    return paginate(db.query(UserModel), UserModel, page.cursor, page.limit)
 
 
-@router.get("/services", response_model=List[ServiceSchema])
+@router.get("/services", response_model=Page[ServiceSchema])
 def list_services(
+    page: dependencies.PageParams = Depends(),
     db: Session = Depends(dependencies.get_db),
     current_user: ServiceModel = Depends(dependencies.get_current_user),
 ):
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Not authorized")
-    services = db.query(ServiceModel).all()
-    return services
+    services = db.query(ServiceModel).options(*SERVICE_LOADERS)
+    return paginate(services, ServiceModel, page.cursor, page.limit)
+
+
+@router.get("/users/export")
+def export_users(
+    export_format: ExportFormat = Query("ndjson", alias="format"),
+    db: Session = Depends(dependencies.get_db),
+    current_user: UserModel = Depends(dependencies.get_current_user),
+):
+    """
+    Streams every user as NDJSON or CSV, without loading the table in memory.
+
+    params
+    - format: ndjson (default) or csv
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    statement = select(
+        UserModel.id,
+        UserModel.username,
+        UserModel.email,
+        UserModel.name,
+        UserModel.role,
+        UserModel.is_active,
+        UserModel.created_at,
+    ).order_by(UserModel.created_at, UserModel.id)
+    return export_response(db, statement, export_format, "users")
+
+
+@router.get("/services/export")
+def export_services(
+    export_format: ExportFormat = Query("ndjson", alias="format"),
+    db: Session = Depends(dependencies.get_db),
+    current_user: UserModel = Depends(dependencies.get_current_user),
+):
+    """
+    Streams every service as NDJSON or CSV, without loading the table in memory.
+
+    params
+    - format: ndjson (default) or csv
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    statement = select(
+        ServiceModel.id,
+        ServiceModel.title,
+        ServiceModel.category,
+        ServiceModel.pricing,
+        ServiceModel.pricing_type,
+        ServiceModel.location,
+        ServiceModel.provider_id,
+        ServiceModel.created_at,
+        ServiceModel.updated_at,
+    ).order_by(ServiceModel.created_at, ServiceModel.id)
+    return export_response(db, statement, export_format, "services")
+
+
+@router.get("/metrics/db-pool")
+def get_db_pool_metrics(
+    current_user: UserModel = Depends(dependencies.get_current_user),
+):
+    """
+    Returns connection pool occupancy (checked out, idle, overflow) and
+    checkout wait times for this worker's engines.
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {
+        "sync": pool_stats(engine),
+        "async": pool_stats(async_engine.sync_engine) if async_engine else None,
+    }
+
+
+@router.get("/metrics/password-hashing")
+def get_password_hashing_metrics(
+    current_user: UserModel = Depends(dependencies.get_current_user),
+):
+    """
+    Returns queue depth, throughput and latency of the bcrypt worker pool.
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return password_hasher.stats()
+
+
+@router.get("/metrics/websockets")
+async def get_websocket_metrics(
+    current_user: UserModel = Depends(dependencies.get_current_user),
+):
+    """
+    Returns open sockets, queued messages and the connections refused,
+    evicted or reaped by this worker.
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return manager.stats()
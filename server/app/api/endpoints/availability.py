@@ -2,9 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import and_
 from sqlalchemy.orm import Session
 from app.api import dependencies
+from app.core.cache import invalidate_slots
+from app.crud.availability import delete_availabilities, upsert_availabilities
 from app.models.user import User
 from app.schemas.availability import RecurringAvailabilityRequestBody
 from app.models.availability import Availability
+from app.utils.pagination import paginate
 from starlette import status
 import logging
 
@@ -21,41 +24,23 @@ def save_recurring_availability(
     current_user: User = Depends(dependencies.get_current_user),
     db: Session = Depends(dependencies.get_db),
 ):
-    for availability in req_body.availabilities:
-        db_availability = (
-            db.query(Availability)
-            .filter(
-                Availability.user_id == current_user.id,
-                Availability.day == availability.day.strip().lower(),
-            )
-            .first()
-        )
-
-        if db_availability:
-            db_availability.start_time = availability.start_time
-            db_availability.end_time = availability.end_time
-            db_availability.is_available = availability.is_available
-        else:
-            db_availability = Availability(
-                user_id=current_user.id,
-                day=availability.day.strip().lower(),
-                start_time=availability.start_time,
-                end_time=availability.end_time,
-                is_available=availability.is_available,
-            )
-            db.add(db_availability)
-
-        logger.info(f"Updated availability for {db_availability.day}")
+    upsert_availabilities(db, current_user.id, req_body.availabilities)
 
-    db.commit()
+    logger.info(
+        f"Updated availability for {', '.join(a.day for a in req_body.availabilities)}"
+    )
 
 
 @router.get("", status_code=status.HTTP_200_OK)
 def get_all_availabilities(
+    page: dependencies.PageParams = Depends(),
     current_user: User = Depends(dependencies.get_current_user),
     db: Session = Depends(dependencies.get_db),
 ):
-    return db.query(Availability).filter(Availability.user_id == current_user.id).all()
+    availabilities = db.query(Availability).filter(
+        Availability.user_id == current_user.id
+    )
+    return paginate(availabilities, Availability, page.cursor, page.limit)
 
 
 @router.get("/{day}", status_code=status.HTTP_200_OK)
@@ -101,6 +86,7 @@ def delete_availability_by_day(
     if availability:
         db.delete(availability)
         db.commit()
+        invalidate_slots(current_user.id)
     else:
         raise HTTPException(status_code=404, detail="Availability not found")
 
@@ -110,12 +96,4 @@ def delete_all_availabilities(
     current_user: User = Depends(dependencies.get_current_user),
     db: Session = Depends(dependencies.get_db),
 ):
-    availabilities = (
-        db.query(Availability).filter(Availability.user_id == current_user.id).all()
-    )
-
-    if availabilities:
-        for availability in availabilities:
-            db.delete(availability)
-
-        db.commit()
+    delete_availabilities(db, current_user.id)
@@ -1,15 +1,41 @@
+import datetime
 import uuid
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
 
 from app.api import dependencies
+from app.core.cache import invalidate_slots
+from app.core.config import settings
+from app.crud.notification import add_notifications
+from app.crud.service import SERVICE_LOADERS
 from app.models.booking import Booking as BookingModel
+from app.models.service import Service as ServiceModel
 from app.models.user import User as UserModel
 from app.schemas.booking import Booking as BookingSchema, BookingCreate
 
 router = APIRouter()
 
+# SQLSTATE raised by the ex_bookings_provider_id_time_range constraint
+EXCLUSION_VIOLATION = "23P01"
+
+# Everything `schemas.booking.Booking` serializes, loaded in a fixed number of
+# queries instead of lazily per attribute
+BOOKING_LOADERS = (
+    joinedload(BookingModel.customer),
+    joinedload(BookingModel.service).options(*SERVICE_LOADERS),
+)
+
+
+def get_booking(db: Session, booking_id: uuid.UUID) -> BookingModel | None:
+    return db.scalars(
+        select(BookingModel)
+        .options(*BOOKING_LOADERS)
+        .where(BookingModel.id == booking_id)
+    ).first()
+
 
 @router.post("/", response_model=BookingSchema)
 def create_booking(
@@ -17,16 +43,51 @@ def create_booking(
     db: Session = Depends(dependencies.get_db),
     current_user: UserModel = Depends(dependencies.get_current_user),
 ):
-    db_booking = BookingModel(**booking.dict(), customer_id=current_user.id)
+    service = db.get(ServiceModel, booking.service_id)
+    if service is None:
+        raise HTTPException(status_code=404, detail="Service not found")
+
+    duration = datetime.timedelta(
+        minutes=booking.duration_minutes or settings.booking_duration_minutes
+    )
+    db_booking = BookingModel(
+        service_id=service.id,
+        customer_id=current_user.id,
+        provider_id=service.provider_id,
+        booking_time=booking.booking_time,
+        end_time=booking.booking_time + duration,
+    )
     db.add(db_booking)
-    db.commit()
-    db.refresh(db_booking)
-    return db_booking
+    try:
+        # The exclusion constraint rejects overlapping bookings atomically,
+        # concurrent requests for the same slot don't need to lock anything.
+        # Flushed first, so a conflict fails before the lock below is taken.
+        db.flush()
+        # Numbering the notification locks the provider's users row until
+        # commit: bookings of one provider only wait on each other for this
+        # last statement and the commit
+        add_notifications(
+            db,
+            [service.provider_id],
+            "New booking request",
+            f"{current_user.name} booked {service.title} for "
+            f"{booking.booking_time:%Y-%m-%d %H:%M}.",
+        )
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if getattr(e.orig, "pgcode", None) == EXCLUSION_VIOLATION:
+            raise HTTPException(
+                status_code=409, detail="This time slot is already booked"
+            )
+        raise
+    invalidate_slots(service.provider_id)
+    return get_booking(db, db_booking.id)
 
 
 @router.get("/{booking_id}", response_model=BookingSchema)
 def read_booking(booking_id: uuid.UUID, db: Session = Depends(dependencies.get_db)):
-    booking = db.query(BookingModel).filter(BookingModel.id == booking_id).first()
+    booking = get_booking(db, booking_id)
     if booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
     return booking
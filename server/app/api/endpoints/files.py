@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Request
+
+from app.utils.http import media_file_response
+
+router = APIRouter()
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"])
+def read_file(path: str, request: Request):
+    """
+    This route serves a stored media file.
+
+    params
+    - path: path of the file relative to the media directory
+    """
+    return media_file_response(request, path)
@@ -1,128 +1,145 @@
-import json
-import uuid
-from datetime import datetime
-
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import WebSocket, WebSocketDisconnect, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+from app.api import dependencies
 from app.core.socket import manager
+from app.crud.notification import (
+    add_notifications,
+    get_notifications_since,
+    get_recent_notifications,
+    mark_notifications_read,
+)
+from app.models.user import User, UserRole
+from app.schemas.notification import NotificationFeed, NotificationsRead
+from app.schemas.user import CurrentUser
 
 router = APIRouter()
 
 
-@router.websocket("/ws/{username}")
-async def websocket_endpoint(websocket: WebSocket, username: str):
-    await manager.connect(websocket, username)
+@router.websocket("/ws")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    token: str | None = None,
+    db: AsyncSession = Depends(dependencies.get_async_session),
+):
+    """
+    This route pushes the notifications of the authenticated user.
+
+    Browsers can't set headers on WebSocket requests, so the access token may
+    be passed as the token query parameter instead of an Authorization
+    header. The server sends {"type": "ping"} periodically, clients must send
+    a message (e.g. {"type": "pong"}) within the idle timeout to stay
+    connected.
+
+    params
+    - token: access token of the user
+    """
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    token = token or (credentials if scheme.lower() == "bearer" else None)
+    try:
+        if not token:
+            raise dependencies.credentials_exception
+        current_user = await dependencies.get_current_user(token, db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        # The socket may stay open for hours, don't hold a pooled connection
+        await db.close()
+
+    connection = await manager.connect(websocket, current_user.username)
+    if connection is None:
+        return
     try:
         while True:
-            data = await websocket.receive_text()
-            # await manager.send_personal_message(
-            #     f"Message from {username}: {data}", username
-            # )
+            await websocket.receive_text()
+            connection.touch()
     except WebSocketDisconnect:
-        manager.disconnect(websocket, username)
-
-
-@router.get("")
-async def get_all_notifications(limit: int = 10):
-    return [
-        {
-            "id": str(uuid.uuid4()),
-            "title": "New booking request",
-            "description": "A customer has requested a booking with you.A customer has requested a booking with you.A customer has requested a booking with you.A customer has requested a booking with you.A customer has requested a booking with you.",
-            "created_at": datetime.now().isoformat(),
-            "read": False,
-        },
-        {
-            "id": "1",
-            "title": "New booking request",
-            "description": "A customer has requested a booking with you.",
-            "created_at": "2021-01-01T12:00:00Z",
-            "read": False,
-        },
-        {
-            "id": "2",
-            "title": "Service update",
-            "description": "A provider has updated their service information.",
-            "created_at": "2021-01-02T12:00:00Z",
-            "read": True,
-        },
-        {
-            "id": "3",
-            "title": "New review",
-            "description": "A customer has left a review for you.",
-            "created_at": "2021-01-03T12:00:00Z",
-            "read": False,
-        },
-        {
-            "id": "4",
-            "title": "Service cancellation",
-            "description": "A booking has been cancelled by a customer.",
-            "created_at": "2021-01-04T12:00:00Z",
-            "read": False,
-        },
-        {
-            "id": "5",
-            "title": "New booking request",
-            "description": "A customer has requested a booking with you.",
-            "created_at": "2021-01-05T12:00:00Z",
-            "read": False,
-        },
-        {
-            "id": "6",
-            "title": "Service update",
-            "description": "A provider has updated their service information.",
-            "created_at": "2021-01-06T12:00:00Z",
-            "read": True,
-        },
-        {
-            "id": "7",
-            "title": "New review",
-            "description": "A customer has left a review for you.",
-            "created_at": "2021-01-07T12:00:00Z",
-            "read": False,
-        },
-        {
-            "id": "8",
-            "title": "Service cancellation",
-            "description": "A booking has been cancelled by a customer.",
-            "created_at": "2021-01-08T12:00:00Z",
-            "read": False,
-        },
-        {
-            "id": "9",
-            "title": "New booking request",
-            "description": "A customer has requested a booking with you.",
-            "created_at": "2021-01-09T12:00:00Z",
-            "read": False,
-        },
-        {
-            "id": "10",
-            "title": "Service update",
-            "description": "A provider has updated their service information.",
-            "created_at": "2021-01-10T12:00:00Z",
-            "read": True,
-        },
-    ][:limit]
+        pass
+    finally:
+        manager.disconnect(websocket, current_user.username)
+
+
+@router.get("", response_model=NotificationFeed)
+def read_recent_notifications(
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(dependencies.get_db),
+    current_user: CurrentUser = Depends(dependencies.get_current_user),
+):
+    """
+    This route returns the newest notifications of the current user, newest
+    first, with the number of unread ones.
+
+    params
+    - limit: maximum number of notifications
+    """
+    return get_recent_notifications(db, current_user.id, limit)
+
+
+@router.get("/delta", response_model=NotificationFeed)
+def read_notifications_since(
+    since: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(dependencies.get_db),
+    current_user: CurrentUser = Depends(dependencies.get_current_user),
+):
+    """
+    This route returns the notifications added after a cursor, oldest first,
+    so a reconnecting client only fetches what it missed.
+
+    params
+    - since: cursor of a previous response, omit to start from the beginning
+    - limit: maximum number of notifications, has_more tells whether to
+      fetch again with the returned cursor
+    """
+    return get_notifications_since(db, current_user.id, since, limit)
+
+
+@router.post("/read")
+def mark_read(
+    body: NotificationsRead,
+    db: Session = Depends(dependencies.get_db),
+    current_user: CurrentUser = Depends(dependencies.get_current_user),
+):
+    """
+    This route marks notifications of the current user as read.
+
+    params
+    - ids: notifications to mark, every unread one when omitted
+    """
+    unread_count = mark_notifications_read(db, current_user.id, body.ids)
+    return {"unread_count": unread_count}
 
 
 @router.post("/send-notification/{username}")
-async def send_notification(username: str, message: str):
-    await manager.send_personal_message(
-        json.dumps(
-            {
-                "id": str(uuid.uuid4()),
-                "title": "New notification",
-                "description": message,
-                "created_at": datetime.now().isoformat(),
-                "read": False,
-            }
-        ),
-        username,
-    )
+def send_notification(
+    username: str,
+    message: str,
+    db: Session = Depends(dependencies.get_db),
+    current_user: CurrentUser = Depends(dependencies.get_current_user),
+):
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    user_id = db.scalar(select(User.id).where(User.username == username))
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    add_notifications(db, [user_id], "New notification", message)
+    db.commit()
     return {"message": f"Notification sent to {username}"}
 
 
 @router.post("/broadcast")
-async def broadcast(message: str):
+async def broadcast(
+    message: str,
+    current_user: CurrentUser = Depends(dependencies.get_current_user),
+):
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
     await manager.broadcast(message)
     return {"message": "Broadcast sent"}
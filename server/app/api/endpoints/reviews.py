@@ -1,12 +1,16 @@
 import uuid
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app.api import dependencies
+from app.crud.review import create_review as create_db_review
+from app.models.booking import Booking as BookingModel
 from app.models.review import Review as ReviewModel
 from app.models.user import User as UserModel
+from app.schemas.pagination import Page
 from app.schemas.review import Review, ReviewCreate
+from app.utils.pagination import paginate
 
 router = APIRouter()
 
@@ -17,14 +21,20 @@ def create_review(
     db: Session = Depends(dependencies.get_db),
     current_user: UserModel = Depends(dependencies.get_current_user),
 ):
-    db_review = ReviewModel(**review.dict())
-    db.add(db_review)
-    db.commit()
-    db.refresh(db_review)
-    return db_review
+    booking = db.get(BookingModel, review.booking_id)
+    if booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    if booking.customer_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
 
+    return create_db_review(db, booking, review)
 
-@router.get("/{service_id}", response_model=list[Review])
-def read_reviews(service_id: uuid.UUID, db: Session = Depends(dependencies.get_db)):
-    reviews = db.query(ReviewModel).filter(ReviewModel.service_id == service_id).all()
-    return reviews
+
+@router.get("/{service_id}", response_model=Page[Review])
+def read_reviews(
+    service_id: uuid.UUID,
+    page: dependencies.PageParams = Depends(),
+    db: Session = Depends(dependencies.get_db),
+):
+    reviews = db.query(ReviewModel).filter(ReviewModel.service_id == service_id)
+    return paginate(reviews, ReviewModel, page.cursor, page.limit)
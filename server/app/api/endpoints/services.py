@@ -1,21 +1,51 @@
+import datetime
+import json
 import uuid
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi import File, Form, UploadFile, status
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy_searchable import search
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 from app.api import dependencies
-from app.crud.service import create_service, update_service
-from app.models.service import Service as ServiceModel, PricingType
+from app.core.cache import response_cache
+from app.core.config import settings
+from app.crud.availability import get_bookable_slots
+from app.crud.service import (
+    SERVICE_SUMMARY_LOADERS,
+    create_service,
+    delete_service,
+    find_services_async,
+    get_service,
+    get_service_async,
+    suggest_services,
+    update_service,
+)
+from app.models.service import (
+    Service as ServiceModel,
+    ServiceMedia as ServiceMediaModel,
+    MediaStatus,
+    PricingType,
+)
 from app.models.user import User as UserModel
-from app.schemas.service import ServiceCreate
+from app.schemas.availability import BookableSlot
+from app.schemas.pagination import Page
+from app.schemas.service import (
+    Service,
+    ServiceCreate,
+    ServiceSearchPage,
+    ServiceSummary,
+)
+from app.utils.http import media_file_response
+from app.utils.media import DEFAULT_MEDIA_FORMAT, MEDIA_VARIANTS
+from app.utils.pagination import paginate_async
 
 router = APIRouter()
 
 
-@router.post("", status_code=status.HTTP_201_CREATED)
+@router.post("", status_code=status.HTTP_201_CREATED, response_model=Service)
 def create_new_service(
         name: str = Form(...),
         category: str = Form(...),
@@ -43,75 +73,223 @@ def create_new_service(
     )
 
     db_service = create_service(db, current_user, req_body)
-    return db.query(ServiceModel).filter_by(id=db_service.id).first()
+    return get_service(db, db_service.id)
 
 
-@router.get("")
-def get_services(
-        db: Session = Depends(dependencies.get_db),
+@router.get("", response_model=Page[ServiceSummary])
+async def get_services(
+        page: dependencies.PageParams = Depends(),
+        db: AsyncSession = Depends(dependencies.get_async_session),
         current_user: UserModel = Depends(dependencies.get_current_user),
 ):
     """
-    This route returns all services available
+    This route returns the services of the current user, one page at a time
+
+    params
+    - cursor: next_cursor of the previous page, omit for the first page
+    - limit: maximum number of services in the page
     """
-    return (
-        db.query(ServiceModel)
-        .options(joinedload(ServiceModel.tags))
-        .filter(ServiceModel.provider_id == current_user.id)
-        .order_by(ServiceModel.updated_at.asc())
-        .all()
+    services = (
+        select(ServiceModel)
+        .options(*SERVICE_SUMMARY_LOADERS)
+        .where(ServiceModel.provider_id == current_user.id)
     )
+    return await paginate_async(db, services, ServiceModel, page.cursor, page.limit)
 
 
-@router.get("/search")
-def search_services(
-        query: str,
+@router.get("/search", response_model=ServiceSearchPage)
+async def search_services(
+        request: Request,
+        query: str = "",
+        category: str | None = None,
+        pricing_type: PricingType | None = None,
+        min_price: float | None = Query(None, ge=0),
+        max_price: float | None = Query(None, ge=0),
+        page: dependencies.PageParams = Depends(),
+        db: AsyncSession = Depends(dependencies.get_async_session),
+):
+    """
+    This route searches the services of every provider, best matches first,
+    considering the title, description, category, location and tags.
+    The response also counts the matches per category and pricing type.
+
+    params
+    - query: search terms, an empty query matches every service
+    - category: only return services of this category
+    - pricing_type: only return services with this pricing type
+    - min_price, max_price: only return services priced within this range
+    - cursor: next_cursor of the previous page, omit for the first page
+    - limit: maximum number of services in the page
+    """
+    async def build():
+        page_result = await find_services_async(
+            db,
+            query,
+            category=category,
+            pricing_type=pricing_type,
+            min_price=min_price,
+            max_price=max_price,
+            cursor=page.cursor,
+            limit=page.limit,
+        )
+        return ServiceSearchPage.model_validate(page_result, from_attributes=True)
+
+    key = json.dumps(
+        [query, category, pricing_type, min_price, max_price, page.cursor, page.limit],
+        default=str,
+    )
+    return await response_cache.response_async(request, "services", key, build)
+
+
+@router.get("/autocomplete")
+def autocomplete_services(
+        q: str = Query(..., max_length=100),
+        limit: int = Query(10, ge=1, le=25),
+        db: Session = Depends(dependencies.get_db),
+):
+    """
+    This route suggests search terms while the user types, tolerating
+    partial words and typos.
+
+    params
+    - q: what the user has typed so far
+    - limit: maximum number of suggestions
+    """
+    return suggest_services(db, q, limit)
+
+
+@router.get("/media/{media_id}/{variant}")
+def read_media_variant(
+        media_id: uuid.UUID,
+        variant: str,
+        request: Request,
+        media_format: str | None = Query(None, alias="format"),
         db: Session = Depends(dependencies.get_db),
-        current_user: UserModel = Depends(dependencies.get_current_user),
 ):
     """
-    This route searches for services using a fuzzy search considering
-    all fields in the database (tags, location, title, description, category, etc.).
+    This route returns one size variant of a media item.
+
+    params
+    - media_id: unique id of the media item
+    - variant: one of thumb, card or full
+    - format: webp or avif, negotiated from the Accept header when omitted
     """
-    # Start with a query object
-    service_query = db.query(ServiceModel).options(joinedload(ServiceModel.tags))
+    media = db.get(ServiceMediaModel, media_id)
+    if media is None or variant not in MEDIA_VARIANTS:
+        raise HTTPException(status_code=404, detail="Media not found")
 
-    # Apply the search filter to the query object
-    service_query = search(service_query, query)
+    if media.status == MediaStatus.failed:
+        # Won't ever be ready, unlike media still processing
+        raise HTTPException(status_code=410, detail="Media processing failed")
+    if media.status != MediaStatus.ready:
+        raise HTTPException(status_code=409, detail="Media is still processing")
 
-    # Filter by the current user
-    service_query = service_query.filter(ServiceModel.provider_id == current_user.id)
+    if not media.variants:
+        # Uploaded before variants were generated, only the original exists
+        return media_file_response(request, media.url)
 
-    # Order by updated_at
-    services = service_query.order_by(ServiceModel.updated_at.asc()).all()
+    formats = media.variants[variant]
+    if media_format is None:
+        accept = request.headers.get("accept", "")
+        media_format = next(
+            (f for f in formats if f != DEFAULT_MEDIA_FORMAT and f"image/{f}" in accept),
+            DEFAULT_MEDIA_FORMAT,
+        )
 
-    if not services:
-        raise HTTPException(status_code=404, detail="No matching services found")
+    if media_format not in formats:
+        raise HTTPException(status_code=404, detail="Format not available")
 
-    return services
+    return media_file_response(
+        request,
+        formats[media_format],
+        media_type=f"image/{media_format}",
+        headers={"Vary": "Accept"},
+    )
 
 
-@router.get("/{service_id}")
-def read_service(service_id: uuid.UUID, db: Session = Depends(dependencies.get_db)):
+@router.get("/{service_id}", response_model=Service)
+async def read_service(
+        service_id: uuid.UUID,
+        request: Request,
+        db: AsyncSession = Depends(dependencies.get_async_session),
+):
     """
-    This route returns a service by its id.
+    This route returns a service by its id. Responses are cached until the
+    service changes and carry an ETag for conditional requests.
 
     params
     - service_id: unique id of the service
     """
-    service = (
-        db.query(ServiceModel)
-        .options(joinedload(ServiceModel.media), joinedload(ServiceModel.tags))
-        .filter(ServiceModel.id == service_id)
-        .first()
+    async def build():
+        service = await get_service_async(db, service_id)
+        if service is None:
+            raise HTTPException(status_code=404, detail="Service not found")
+        return Service.model_validate(service)
+
+    return await response_cache.response_async(
+        request, f"service:{service_id}", "detail", build
     )
+
+
+@router.get("/{service_id}/slots", response_model=list[BookableSlot])
+def read_service_slots(
+        service_id: uuid.UUID,
+        start: datetime.date,
+        end: datetime.date,
+        request: Request,
+        duration_minutes: int = Query(
+            settings.booking_duration_minutes, ge=5, le=24 * 60
+        ),
+        db: Session = Depends(dependencies.get_db),
+):
+    """
+    This route returns the free slots of the provider of a service, from its
+    weekly availability minus the bookings it already has.
+
+    params
+    - service_id: unique id of the service
+    - start: first date to return slots for
+    - end: date after the last one to return slots for
+    - duration_minutes: length of each slot
+    """
+    if not 0 < (end - start).days <= settings.slot_max_range_days:
+        raise HTTPException(
+            status_code=400,
+            detail=f"end must be 1 to {settings.slot_max_range_days} days after start",
+        )
+
+    service = db.get(ServiceModel, service_id)
     if service is None:
         raise HTTPException(status_code=404, detail="Service not found")
 
-    return service
+    # Slots that already started are left out. They start on whole minutes,
+    # so when the range can hold started ones the current minute is part of
+    # the key, and every entry holds exactly the slots not started yet
+    now = datetime.datetime.now().replace(second=0, microsecond=0)
+    key = f"{start}:{end}:{duration_minutes}"
+    if start <= now.date():
+        key += f":{now.isoformat()}"
+
+    def build():
+        slots = get_bookable_slots(
+            db,
+            service.provider_id,
+            start,
+            end,
+            datetime.timedelta(minutes=duration_minutes),
+        )
+        return [
+            {"start": slot_start, "end": slot_end}
+            for slot_start, slot_end in slots
+            if slot_start > now
+        ]
 
+    return response_cache.response(
+        request, f"slots:{service.provider_id}", key, build
+    )
 
-@router.put("/{service_id}")
+
+@router.put("/{service_id}", response_model=Service)
 def update_existing_service(
         service_id: uuid.UUID,
         name: str = Form(...),
@@ -136,12 +314,7 @@ def update_existing_service(
         media=media,
     )
 
-    db_service = (
-        db.query(ServiceModel)
-        .options(joinedload(ServiceModel.media), joinedload(ServiceModel.tags))
-        .filter(ServiceModel.id == service_id)
-        .first()
-    )
+    db_service = get_service(db, service_id)
 
     if not db_service:
         raise HTTPException(status_code=404, detail="Service not found")
@@ -150,11 +323,11 @@ def update_existing_service(
         raise HTTPException(status_code=403, detail="Not authorized")
 
     db_service = update_service(db, db_service, req_body)
-    return db.query(ServiceModel).filter_by(id=db_service.id).first()
+    return get_service(db, db_service.id)
 
 
 @router.delete("/{service_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_service(
+def delete_existing_service(
         service_id: uuid.UUID,
         db: Session = Depends(dependencies.get_db),
         current_user: UserModel = Depends(dependencies.get_current_user),
@@ -167,5 +340,4 @@ def delete_service(
     if service.provider_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    db.delete(service)
-    db.commit()
+    delete_service(db, service)
@@ -1,11 +1,12 @@
 from datetime import datetime, timezone
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 
 from app.api import dependencies
 from app.core import security
@@ -20,23 +21,18 @@ from app.schemas.user import (
     UserForgotPassword,
     UserResetPassword,
     UserSignUpResponse,
+    CurrentUser,
+    User,
 )
-from app.utils.mail import send_verification_email, send_reset_password_email
 
 router = APIRouter()
 
+# The endpoints hashing passwords are async and await the hash, so requests
+# queued on the password hasher don't hold request threadpool threads. Their
+# database work goes through run_in_threadpool with the sync session.
 
-@router.post(
-    "/sign-up", response_model=UserSignUpResponse, status_code=status.HTTP_201_CREATED
-)
-def register_service_provider(
-    req_body: UserCreate,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(dependencies.get_db),
-):
-    if req_body.role == UserRole.admin:
-        raise HTTPException(status_code=403, detail="forbidden")
 
+def check_new_user(db: Session, req_body: UserCreate):
     existing_username = (
         db.query(UserModel).filter(UserModel.username == req_body.username).first()
     )
@@ -51,43 +47,78 @@ def register_service_provider(
     if existing_email is not None:
         raise HTTPException(status_code=400, detail="email already in use")
 
-    user = create_user(db, req_body)
 
-    token = create_token(db, user, TokenType.verify_email)
+def add_user(db: Session, req_body: UserCreate, hashed_password: str) -> dict:
+    user = create_user(db, req_body, hashed_password)
 
-    background_tasks.add_task(
-        send_verification_email,
-        name=user.name,
-        email=user.email,
-        token=token.id,
-    )
+    # Emailed through the outbox
+    create_token(db, user, TokenType.verify_email)
 
-    access_token = security.create_access_token(data={"sub": user.username})
+    access_token = security.create_access_token(data=security.access_token_claims(user))
 
-    return {"user": user, "access_token": access_token}
+    return {"user": User.model_validate(user), "access_token": access_token}
 
 
-@router.post("/sign-in", response_model=AuthToken, status_code=status.HTTP_200_OK)
-def login(
-    user: Annotated[OAuth2PasswordRequestForm, Depends()],
+def set_password(
+    db: Session, db_user: UserModel, hashed_password: str, revoke_tokens: bool
+):
+    db_user.hashed_password = hashed_password
+    if revoke_tokens:
+        db_user.token_version += 1
+
+    db.commit()
+
+
+@router.post(
+    "/sign-up", response_model=UserSignUpResponse, status_code=status.HTTP_201_CREATED
+)
+async def register_service_provider(
+    req_body: UserCreate,
     db: Session = Depends(dependencies.get_db),
 ):
-    db_user = (
+    if req_body.role == UserRole.admin:
+        raise HTTPException(status_code=403, detail="forbidden")
+
+    await run_in_threadpool(check_new_user, db, req_body)
+
+    hashed_password = await security.get_password_hash(req_body.password)
+
+    return await run_in_threadpool(add_user, db, req_body, hashed_password)
+
+
+def find_login_user(db: Session, login: str) -> UserModel | None:
+    return (
         db.query(UserModel)
-        .filter(
-            or_(UserModel.username == user.username, UserModel.email == user.username)
-        )
+        .filter(or_(UserModel.username == login, UserModel.email == login))
         .first()
     )
 
-    print(user.username, user.password)
-    print(db_user)
 
-    if not db_user or not security.verify_password(
+@router.post("/sign-in", response_model=AuthToken, status_code=status.HTTP_200_OK)
+async def login(
+    user: Annotated[OAuth2PasswordRequestForm, Depends()],
+    db: Session = Depends(dependencies.get_db),
+):
+    db_user = await run_in_threadpool(find_login_user, db, user.username)
+
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    is_valid, new_hash = await security.verify_and_update_password(
         user.password, db_user.hashed_password
-    ):
+    )
+    if not is_valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    access_token = security.create_access_token(data={"sub": db_user.username})
+
+    access_token = security.create_access_token(
+        data=security.access_token_claims(db_user)
+    )
+
+    if new_hash:
+        # The hash was made with an outdated cost factor, replace it now that
+        # we know the plain password
+        await run_in_threadpool(set_password, db, db_user, new_hash, False)
+
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -113,50 +144,44 @@ def verify_email(
     user.is_active = True
     db.commit()
 
+    security.invalidate_principal(user.id)
+
 
 @router.post("/change-password", status_code=status.HTTP_204_NO_CONTENT)
-def change_password(
+async def change_password(
     req_body: UserChangePassword,
-    current_user: UserModel = Depends(dependencies.get_current_user),
+    current_user: CurrentUser = Depends(dependencies.get_current_user),
     db: Session = Depends(dependencies.get_db),
 ):
-    if not security.verify_password(
-        req_body.current_password, current_user.hashed_password
+    db_user = await run_in_threadpool(db.get, UserModel, current_user.id)
+
+    if not await security.verify_password(
+        req_body.current_password, db_user.hashed_password
     ):
         raise HTTPException(status_code=401, detail="Invalid current password")
 
-    new_password = security.get_password_hash(req_body.new_password)
-    current_user.hashed_password = new_password
+    new_password = await security.get_password_hash(req_body.new_password)
+    # Tokens issued with the old password must not outlive it
+    await run_in_threadpool(set_password, db, db_user, new_password, True)
 
-    db.commit()
+    security.invalidate_principal(current_user.id)
 
 
 @router.post("/forgot-password", status_code=status.HTTP_204_NO_CONTENT)
 def forgot_password(
     req_body: UserForgotPassword,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(dependencies.get_db),
 ):
     db_user = db.query(UserModel).filter(UserModel.email == req_body.email).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    db_token = create_token(db, db_user, TokenType.reset_password)
-
-    background_tasks.add_task(
-        send_reset_password_email,
-        name=db_user.name,
-        email=db_user.email,
-        token=db_token.id,
-    )
+    # Emailed through the outbox
+    create_token(db, db_user, TokenType.reset_password)
 
 
-@router.post("/reset-password", status_code=status.HTTP_204_NO_CONTENT)
-def reset_password(
-    req_body: UserResetPassword,
-    db: Session = Depends(dependencies.get_db),
-):
-    db_token = db.query(TokenModel).filter(TokenModel.id == req_body.token).first()
+def find_reset_user(db: Session, token: str) -> UserModel:
+    db_token = db.query(TokenModel).filter(TokenModel.id == token).first()
     if not db_token or db_token.expires_at <= datetime.now():
         raise HTTPException(status_code=400, detail="Invalid/Expired Token")
 
@@ -164,15 +189,27 @@ def reset_password(
     if not db_user:
         raise HTTPException(status_code=400, detail="Invalid/Expired Token")
 
-    new_password = security.get_password_hash(req_body.password)
-    db_user.hashed_password = new_password
+    return db_user
 
-    db.commit()
+
+@router.post("/reset-password", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_password(
+    req_body: UserResetPassword,
+    db: Session = Depends(dependencies.get_db),
+):
+    db_user = await run_in_threadpool(find_reset_user, db, req_body.token)
+    user_id = db_user.id
+
+    new_password = await security.get_password_hash(req_body.password)
+    # A forgotten password may mean a leaked one, so revoke every token
+    # issued so far
+    await run_in_threadpool(set_password, db, db_user, new_password, True)
+
+    security.invalidate_principal(user_id)
 
 
-@router.get("/current-user", status_code=status.HTTP_200_OK)
+@router.get("/current-user", response_model=User, status_code=status.HTTP_200_OK)
 def get_current_user(
-    current_user: UserModel = Depends(dependencies.get_current_user),
+    current_user: CurrentUser = Depends(dependencies.get_current_user),
 ):
-    del current_user.hashed_password
     return current_user
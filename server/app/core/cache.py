@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Protocol
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.utils.cache import TTLCache
+from app.utils.http import etag_matches
+
+logger = logging.getLogger(__name__)
+
+# Cached responses are reused, but clients have to revalidate them with the
+# ETag since a write can change them at any time
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> bytes | None: ...
+
+    def set(self, key: str, value: bytes, ttl: int | None = None): ...
+
+
+class MemoryCacheBackend:
+    """Per worker LRU, entries without a ttl are only dropped when evicted."""
+
+    def __init__(self, maxsize: int):
+        self._cache = TTLCache(maxsize, ttl=float("inf"))
+
+    def get(self, key: str) -> bytes | None:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int | None = None):
+        self._cache.set(key, value, ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class RedisCacheBackend:
+    """Shares cached entries and their invalidation between workers."""
+
+    def __init__(self, url: str, client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self._redis = client
+
+    def get(self, key: str) -> bytes | None:
+        return self._redis.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int | None = None):
+        self._redis.set(key, value, ex=ttl)
+
+
+class ResponseCache:
+    """
+    Read-through cache of serialized JSON responses.
+
+    Entries belong to a namespace (e.g. "service:<id>") and writes invalidate
+    whole namespaces. Every namespace has a version token that is part of the
+    entry keys, invalidating replaces the token so older entries are never
+    read again and simply expire. The version is read before the response is
+    built, so a response built from data that changed meanwhile is stored
+    under the old version and can't outlive the write.
+
+    Backend errors are logged and the response is built without the cache.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _version(self, namespace: str) -> str:
+        key = f"cache-version:{namespace}"
+        version = self.backend.get(key)
+        if version is None:
+            version = uuid.uuid4().hex.encode()
+            self.backend.set(key, version)
+        return version.decode()
+
+    def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            try:
+                self.backend.set(
+                    f"cache-version:{namespace}", uuid.uuid4().hex.encode()
+                )
+            except Exception:
+                logger.exception(f"Could not invalidate cached {namespace}")
+
+    def _lookup(self, namespace: str, key: str) -> tuple[str | None, bytes | None]:
+        try:
+            entry_key = f"cache:{namespace}:{self._version(namespace)}:{key}"
+            return entry_key, self.backend.get(entry_key)
+        except Exception:
+            logger.exception(f"Could not read cached {namespace}")
+            return None, None
+
+    def _store(self, entry_key: str, entry: bytes):
+        try:
+            self.backend.set(entry_key, entry, self.ttl)
+        except Exception:
+            logger.exception(f"Could not cache {entry_key}")
+
+    def response(
+        self, request: Request, namespace: str, key: str, build: Callable[[], Any]
+    ) -> Response:
+        """
+        Returns the cached JSON response for `key`, calling `build` and
+        storing its serialized result on a miss. Requests whose
+        If-None-Match matches the ETag get an empty 304.
+        """
+        entry_key, entry = self._lookup(namespace, key)
+        if entry is None:
+            entry = self._entry(build())
+            if entry_key is not None:
+                self._store(entry_key, entry)
+        return self._respond(request, entry)
+
+    async def response_async(
+        self,
+        request: Request,
+        namespace: str,
+        key: str,
+        build: Callable[[], Awaitable[Any]],
+    ) -> Response:
+        """`response` for async routes, `build` is awaited."""
+        entry_key, entry = await self._call_backend(self._lookup, namespace, key)
+        if entry is None:
+            entry = self._entry(await build())
+            if entry_key is not None:
+                await self._call_backend(self._store, entry_key, entry)
+        return self._respond(request, entry)
+
+    async def _call_backend(self, fn, *args):
+        # Only the in process backend doesn't block the event loop
+        if isinstance(self.backend, MemoryCacheBackend):
+            return fn(*args)
+        return await run_in_threadpool(fn, *args)
+
+    @staticmethod
+    def _entry(content: Any) -> bytes:
+        body = json.dumps(jsonable_encoder(content), separators=(",", ":")).encode()
+        etag = '"' + hashlib.md5(body, usedforsecurity=False).hexdigest() + '"'
+        return etag.encode() + b"\n" + body
+
+    @staticmethod
+    def _respond(request: Request, entry: bytes) -> Response:
+        etag, body = entry.split(b"\n", 1)
+        etag = etag.decode()
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+
+def create_cache_backend() -> CacheBackend:
+    if settings.cache_backend == "redis":
+        return RedisCacheBackend(settings.cache_redis_url)
+    return MemoryCacheBackend(settings.response_cache_max_size)
+
+
+response_cache = ResponseCache(
+    create_cache_backend(), ttl=settings.response_cache_ttl_seconds
+)
+
+
+def invalidate_services(*service_ids: uuid.UUID):
+    """Drops the cached detail of the services and every cached search."""
+    response_cache.invalidate(
+        "services", *(f"service:{service_id}" for service_id in service_ids)
+    )
+
+
+def invalidate_slots(provider_id: uuid.UUID):
+    """Drops the cached slots of a provider after its availability or bookings change."""
+    response_cache.invalidate(f"slots:{provider_id}")
@@ -1,12 +1,97 @@
+from typing import Literal
+
 from pydantic import EmailStr
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     database_url: str
+    # When enabled, an asyncpg-backed AsyncEngine is created alongside the
+    # synchronous one and the async read routes (service detail, list and
+    # search, authentication) use AsyncSession objects from `get_async_db`.
+    # Otherwise they run the sync session in the threadpool.
+    # `async_database_url` defaults to `database_url` with the asyncpg driver.
+    async_database: bool = False
+    async_database_url: str | None = None
+    # Connection pool sizing, applied per engine (so per worker process)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
+    # Authenticated principals are cached per worker, so a request with a
+    # valid token normally needs no database lookup
+    auth_cache_max_size: int = 10000
+    auth_cache_ttl_seconds: int = 60
+    # bcrypt runs on its own thread pool, requests beyond the pending limit
+    # are rejected with a 503 instead of queueing behind a login storm.
+    # Changing the rounds rehashes passwords transparently on next sign in.
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 32
+    media_directory: str = "./files/"
+    # Uploads as received, metadata included. /files serves everything in
+    # `media_directory`, so they're kept outside of it.
+    media_originals_directory: str = "./originals/"
+    media_max_upload_bytes: int = 10 * 1024 * 1024
+    # Multipart bodies are rejected past this size before they're parsed
+    # (and spooled to disk), every file is then capped by the above
+    media_max_request_bytes: int = 50 * 1024 * 1024
+    # Image variants are generated by a background process pool, 0 runs
+    # the jobs inline instead (useful for tests and debugging)
+    media_workers: int = 2
+    media_max_attempts: int = 3
+    media_retry_delay_seconds: float = 2
+    # When set (e.g. "/protected-files"), /files responses only carry an
+    # X-Accel-Redirect header and the reverse proxy streams the body
+    media_accel_redirect_prefix: str | None = None
+    # Page size of the cursor paginated list endpoints
+    page_size_default: int = 50
+    page_size_max: int = 200
+    # Bookable slots are computed from the weekly availability minus the
+    # bookings, and cached per provider until either changes
+    booking_duration_minutes: int = 60
+    slot_max_range_days: int = 31
+    # Serialized responses of the hot public endpoints (service detail,
+    # search and slots). "memory" keeps them per worker, so a write only
+    # invalidates the worker that handled it; "redis" shares the entries and
+    # their invalidation between workers
+    cache_backend: Literal["memory", "redis"] = "memory"
+    cache_redis_url: str = "redis://localhost:6379/0"
+    response_cache_max_size: int = 10000
+    response_cache_ttl_seconds: int = 60
+    # WebSocket messages are published on a backplane that every worker
+    # subscribes to. "memory" only reaches the connections of the publishing
+    # worker, use "redis" (cache_redis_url) or "postgres" (LISTEN/NOTIFY on
+    # database_url) when running several workers
+    socket_backplane: Literal["memory", "redis", "postgres"] = "memory"
+    socket_backplane_channel: str = "notifications"
+    # Messages wait in a bounded queue per connection, clients that fall
+    # further behind, or take longer than the timeout to accept a send, are
+    # disconnected instead of slowing down delivery to everyone else
+    socket_send_queue_size: int = 100
+    socket_send_timeout_seconds: float = 5
+    # Clients are pinged every interval and disconnected after sending
+    # nothing for the idle timeout. A user's oldest connection is closed
+    # beyond the per user cap, new connections are refused beyond the total
+    socket_heartbeat_interval_seconds: float = 25
+    socket_idle_timeout_seconds: float = 60
+    socket_max_connections_per_user: int = 5
+    socket_max_connections: int = 10000
+    # Side effects (emails, pushes) are written to the outbox in the same
+    # transaction as the change causing them, and carried out by a
+    # dispatcher loop in every worker. Disable it to run without one, e.g.
+    # in tests. Failed events are retried with a linear backoff
+    outbox_dispatcher_enabled: bool = True
+    outbox_batch_size: int = 100
+    outbox_poll_interval_seconds: float = 1
+    outbox_lease_seconds: float = 60
+    outbox_max_attempts: int = 10
+    outbox_retry_delay_seconds: float = 5
+    outbox_retention_hours: int = 72
 
     mail_username: str
     mail_password: str
@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core.cache import invalidate_services
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.service import MediaStatus, ServiceMedia
+from app.utils.media import DEFAULT_MEDIA_FORMAT, generate_variants
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MediaJob:
+    content_hash: str
+    source: str
+    output_directory: str
+    attempt: int = 1
+
+
+class MediaPipeline:
+    """
+    Generates the size variants of uploaded images outside the request. Jobs
+    run on a process pool (image encoding holds the GIL), failures are
+    retried with a linear backoff, and the media rows are flipped from
+    `processing` to `ready` (or `failed`) once the job settles.
+
+    Media is content addressed: every row sharing the job's content hash is
+    updated, and a hash that is already being processed isn't queued again.
+
+    Jobs only live in the worker's memory, `resume` requeues the media a
+    stopped worker left `processing`.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_attempts: int,
+        retry_delay: float,
+        session_factory=SessionLocal,
+    ):
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.session_factory = session_factory
+        self._executor: ProcessPoolExecutor | None = None
+        self._in_flight: set[str] = set()
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def submit(self, jobs: list[MediaJob]):
+        """
+        Queues jobs for processing. Must only be called once the media rows
+        are committed, since completion updates them from another session.
+        """
+        for job in jobs:
+            with self._lock:
+                if job.content_hash in self._in_flight:
+                    # The running job updates every row with this hash
+                    continue
+                self._in_flight.add(job.content_hash)
+            self._submit(job)
+
+    def resume(self):
+        """
+        Submits a job for every content hash still `processing`, called when
+        the worker starts. Media another worker is processing may be
+        processed twice, which only rewrites the same variant files.
+        """
+        db: Session = self.session_factory()
+        try:
+            content_hashes = db.scalars(
+                select(ServiceMedia.content_hash)
+                .where(
+                    ServiceMedia.status == MediaStatus.processing,
+                    ServiceMedia.content_hash.is_not(None),
+                )
+                .distinct()
+            ).all()
+        except Exception:
+            logger.exception("Could not list the media left processing")
+            return
+        finally:
+            db.close()
+
+        jobs = []
+        for content_hash in content_hashes:
+            source = find_original(content_hash)
+            if source is None:
+                logger.error(f"The original of media {content_hash} is missing")
+                self._update_media(content_hash, status=MediaStatus.failed)
+                continue
+            jobs.append(MediaJob(content_hash, source, settings.media_directory))
+        if jobs:
+            logger.info(f"Resuming the processing of {len(jobs)} media")
+        self.submit(jobs)
+
+    def _submit(self, job: MediaJob):
+        args = (generate_variants, job.source, job.output_directory, job.content_hash)
+        if self.max_workers == 0:
+            future = Future()
+            try:
+                future.set_result(args[0](*args[1:]))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            future = self._get_executor().submit(*args)
+        future.add_done_callback(lambda f: self._on_done(job, f))
+
+    def _on_done(self, job: MediaJob, future: Future):
+        error = future.exception()
+        if error is None:
+            # Leave the in-flight set before updating, a row committed after
+            # the update below then gets a job of its own
+            self._release(job)
+            variants = future.result()
+            self._update_media(
+                job.content_hash,
+                status=MediaStatus.ready,
+                variants=variants,
+                url=variants["full"][DEFAULT_MEDIA_FORMAT],
+            )
+            return
+
+        if job.attempt < self.max_attempts:
+            logger.warning(
+                f"Processing media {job.content_hash} failed (attempt {job.attempt}), "
+                f"retrying: {error}"
+            )
+            job.attempt += 1
+            timer = threading.Timer(self.retry_delay * job.attempt, self._submit, [job])
+            timer.daemon = True
+            timer.start()
+        else:
+            logger.error(f"Processing media {job.content_hash} failed: {error}")
+            self._release(job)
+            self._update_media(job.content_hash, status=MediaStatus.failed)
+
+    def _release(self, job: MediaJob):
+        with self._lock:
+            self._in_flight.discard(job.content_hash)
+
+    def _update_media(self, content_hash: str, **values):
+        db: Session = self.session_factory()
+        try:
+            service_ids = db.scalars(
+                update(ServiceMedia)
+                .where(
+                    ServiceMedia.content_hash == content_hash,
+                    ServiceMedia.status != MediaStatus.ready,
+                )
+                .values(**values)
+                .returning(ServiceMedia.service_id)
+            ).all()
+            db.commit()
+            # The cached services still show the media as processing
+            invalidate_services(*set(service_ids))
+        except Exception:
+            logger.exception(f"Could not update media {content_hash}")
+        finally:
+            db.close()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def find_original(content_hash: str) -> str | None:
+    # Earlier versions stored the originals in the media directory
+    for directory in [
+        settings.media_originals_directory,
+        os.path.join(settings.media_directory, "originals"),
+    ]:
+        path = os.path.join(directory, content_hash)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+media_pipeline = MediaPipeline(
+    max_workers=settings.media_workers,
+    max_attempts=settings.media_max_attempts,
+    retry_delay=settings.media_retry_delay_seconds,
+)
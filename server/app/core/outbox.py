@@ -0,0 +1,236 @@
+import asyncio
+import datetime
+import logging
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.outbox import OutboxEvent, utcnow
+
+logger = logging.getLogger(__name__)
+
+OutboxHandler = Callable[[dict], Awaitable[Any]]
+
+# topic -> handler, filled by `outbox_handler`
+handlers: dict[str, OutboxHandler] = {}
+
+# Session.info key set when a transaction wrote outbox events
+PENDING_EVENTS = "outbox_pending"
+# Seconds between deletions of the processed events
+PRUNE_INTERVAL = 3600
+
+
+def outbox_handler(topic: str):
+    """Registers the coroutine function carrying out the events of a topic."""
+
+    def register(handler: OutboxHandler) -> OutboxHandler:
+        handlers[topic] = handler
+        return handler
+
+    return register
+
+
+def enqueue(db: Session, topic: str, payload: dict):
+    """
+    Records a side effect in the current transaction. It is only carried out
+    if the transaction commits, and at least once: handlers must tolerate
+    being called again for the same payload.
+    """
+    db.add(OutboxEvent(topic=topic, payload=payload))
+    db.info[PENDING_EVENTS] = True
+
+
+@event.listens_for(Session, "after_commit")
+def wake_dispatcher(session: Session):
+    if session.info.pop(PENDING_EVENTS, False):
+        outbox_dispatcher.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_pending_events(session: Session):
+    session.info.pop(PENDING_EVENTS, None)
+
+
+class OutboxDispatcher:
+    """
+    Carries out the outbox events in batches, outside the requests.
+
+    A batch is claimed with FOR UPDATE SKIP LOCKED and leased by pushing its
+    available_at forward, in one short transaction, so several workers can
+    dispatch concurrently without handling the same event twice and without
+    holding locks while the handlers run. Events whose handler fails are
+    retried with a linear backoff, then marked failed. An event whose worker
+    died mid-batch is claimed again once its lease expires.
+
+    The loop polls, and is woken up as soon as a transaction writing events
+    commits in this worker.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        poll_interval: float,
+        lease: float,
+        max_attempts: int,
+        retry_delay: float,
+        retention: datetime.timedelta,
+        session_factory=SessionLocal,
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retention = retention
+        self.session_factory = session_factory
+        self._pruned_at = 0.0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._loop = None
+
+    def wake(self):
+        """Thread safe, requests run in the thread pool."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            try:
+                dispatched = await self.dispatch()
+                if self._loop.time() - self._pruned_at > PRUNE_INTERVAL:
+                    self._pruned_at = self._loop.time()
+                    await run_in_threadpool(self._prune)
+            except Exception:
+                logger.exception("Could not dispatch the outbox")
+                dispatched = 0
+
+            if dispatched < self.batch_size:
+                # Caught up, wait for new events
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def dispatch(self) -> int:
+        """Claims and carries out one batch, returns the number of events."""
+        events = await run_in_threadpool(self._claim)
+        results = await asyncio.gather(
+            *(self._handle(topic, payload) for _, topic, payload, _ in events),
+            return_exceptions=True,
+        )
+        await run_in_threadpool(self._settle, events, results)
+        return len(events)
+
+    async def _handle(self, topic: str, payload: dict):
+        handler = handlers.get(topic)
+        if handler is None:
+            raise LookupError(f"No outbox handler for {topic}")
+        await handler(payload)
+
+    def _claim(self) -> list[tuple]:
+        now = utcnow()
+        claimable = (
+            select(OutboxEvent.id)
+            .where(
+                OutboxEvent.processed_at.is_(None),
+                OutboxEvent.failed_at.is_(None),
+                OutboxEvent.available_at <= now,
+            )
+            .order_by(OutboxEvent.available_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        db: Session = self.session_factory()
+        try:
+            events = db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(claimable.scalar_subquery()))
+                .values(
+                    available_at=now + datetime.timedelta(seconds=self.lease),
+                    attempts=OutboxEvent.attempts + 1,
+                )
+                .returning(
+                    OutboxEvent.id,
+                    OutboxEvent.topic,
+                    OutboxEvent.payload,
+                    OutboxEvent.attempts,
+                )
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+            return events
+        finally:
+            db.close()
+
+    def _settle(self, events: list[tuple], results: list):
+        now = utcnow()
+        processed = [
+            claimed[0] for claimed, result in zip(events, results) if result is None
+        ]
+        db: Session = self.session_factory()
+        try:
+            if processed:
+                db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_(processed))
+                    .values(processed_at=now, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+            for (id, topic, _, attempts), error in zip(events, results):
+                if error is None:
+                    continue
+                logger.warning(f"Outbox event {id} ({topic}) failed: {error!r}")
+                if attempts >= self.max_attempts:
+                    values = {"failed_at": now}
+                else:
+                    delay = datetime.timedelta(seconds=self.retry_delay * attempts)
+                    values = {"available_at": now + delay}
+                db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id == id)
+                    .values(last_error=repr(error), **values)
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+        finally:
+            db.close()
+
+    def _prune(self):
+        """Deletes the events processed longer ago than the retention."""
+        db: Session = self.session_factory()
+        try:
+            db.execute(
+                delete(OutboxEvent).where(
+                    OutboxEvent.processed_at < utcnow() - self.retention
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+outbox_dispatcher = OutboxDispatcher(
+    batch_size=settings.outbox_batch_size,
+    poll_interval=settings.outbox_poll_interval_seconds,
+    lease=settings.outbox_lease_seconds,
+    max_attempts=settings.outbox_max_attempts,
+    retry_delay=settings.outbox_retry_delay_seconds,
+    retention=datetime.timedelta(hours=settings.outbox_retention_hours),
+)
@@ -1,19 +1,146 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 
 from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.utils.cache import TTLCache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds
+)
 
+# user id -> schemas.user.CurrentUser, see `api.dependencies.get_current_user`
+principal_cache = TTLCache(
+    maxsize=settings.auth_cache_max_size, ttl=settings.auth_cache_ttl_seconds
+)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
 
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already pending."""
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated thread pool. The bcrypt C code releases the
+    GIL so threads are enough to use several cores. Callers await the
+    result on the event loop, so a burst of sign ins queued here holds no
+    request threadpool thread and can't starve the other endpoints. At most
+    `max_pending` hashes may be queued or running, further calls fail fast
+    with `PasswordHasherBusy`.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hasher"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_queue_wait = 0.0
+        self.total_run_time = 0.0
+
+    async def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy()
+
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_queue_wait += started_at - submitted_at
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.total_run_time += time.perf_counter() - started_at
+
+        try:
+            future = self._executor.submit(task)
+        except BaseException:
+            self._slots.release()
+            raise
+        # Released once the hash is done rather than when the caller stops
+        # waiting, a cancelled request doesn't stop a running hash
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        return await self._run(
+            pwd_context.verify_and_update, plain_password, hashed_password
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_queue_wait_ms": (
+                    self.total_queue_wait / self.completed * 1000
+                    if self.completed
+                    else 0.0
+                ),
+                "avg_hash_ms": (
+                    self.total_run_time / self.completed * 1000
+                    if self.completed
+                    else 0.0
+                ),
+            }
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+)
+
+
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """
+    Verifies a password and, when the stored hash was made with outdated
+    settings (e.g. fewer bcrypt rounds), also returns a fresh hash to store.
+    """
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -29,3 +156,23 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
         to_encode, settings.secret_key, algorithm=settings.algorithm
     )
     return encoded_jwt
+
+
+def access_token_claims(user) -> dict:
+    """
+    Returns the claims identifying `user` in an access token. `ver` must
+    match the user's current token version for the token to be accepted.
+    """
+    return {
+        "sub": user.username,
+        "uid": str(user.id),
+        "ver": user.token_version or 0,
+    }
+
+
+def invalidate_principal(user_id: uuid.UUID):
+    """
+    Drops the cached principal of a user, must be called whenever the
+    password, role, active flag or token version of the user changes.
+    """
+    principal_cache.pop(user_id)
@@ -1,32 +1,422 @@
-from typing import List, Dict
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List
 
-from fastapi import WebSocket
+from fastapi import WebSocket, status
+from sqlalchemy import make_url
 
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Messages travel between workers as {"username": str | None, "message": str},
+# a username of None is a broadcast
+MessageHandler = Callable[[dict], Awaitable[None]]
+
+# Sent every heartbeat interval, clients answer with any message
+PING = json.dumps({"type": "ping"})
+
+
+class Backplane(ABC):
+    """
+    Carries messages between the workers, each worker subscribes once and
+    delivers what it receives to its own connections.
+    """
+
+    @abstractmethod
+    async def start(self, handler: MessageHandler): ...
+
+    @abstractmethod
+    async def publish(self, message: dict): ...
+
+    async def stop(self):
+        pass
+
+
+class MemoryBackplane(Backplane):
+    """Delivers within the process, for a single worker and for tests."""
 
-class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+        self._handlers: list[MessageHandler] = []
+
+    async def start(self, handler: MessageHandler):
+        self._handlers.append(handler)
+
+    async def publish(self, message: dict):
+        for handler in list(self._handlers):
+            await handler(message)
+
+    async def stop(self):
+        self._handlers.clear()
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis pub/sub, resubscribing after connection errors. Starting waits at
+    most `start_timeout` for the subscription, an unreachable Redis doesn't
+    keep the worker from serving requests, it subscribes once Redis is back.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        channel: str,
+        client=None,
+        retry_delay: float = 1,
+        start_timeout: float = 5,
+    ):
+        if client is None:
+            from redis import asyncio as aioredis
+
+            client = aioredis.Redis.from_url(url)
+        self._redis = client
+        self.channel = channel
+        self.retry_delay = retry_delay
+        self.start_timeout = start_timeout
+        self._task: asyncio.Task | None = None
+
+    async def start(self, handler: MessageHandler):
+        subscribed = asyncio.Event()
+        self._task = asyncio.create_task(self._listen(handler, subscribed))
+        try:
+            await asyncio.wait_for(subscribed.wait(), self.start_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Not subscribed to {self.channel} yet, messages from other "
+                "workers are missed until Redis is reachable"
+            )
+
+    async def _listen(self, handler: MessageHandler, subscribed: asyncio.Event):
+        while True:
+            try:
+                async with self._redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    subscribed.set()
+                    async for message in pubsub.listen():
+                        await dispatch(handler, message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Lost the {self.channel} subscription, retrying")
+                await asyncio.sleep(self.retry_delay)
+
+    async def publish(self, message: dict):
+        await self._redis.publish(self.channel, json.dumps(message))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._redis.aclose()
+
+
+class PostgresBackplane(Backplane):
+    """
+    Postgres LISTEN/NOTIFY on a dedicated connection, messages are published
+    from a small pool. NOTIFY payloads are limited to 8000 bytes.
+    """
+
+    def __init__(self, dsn: str, channel: str, retry_delay: float = 1):
+        self.dsn = dsn
+        self.channel = channel
+        self.retry_delay = retry_delay
+        self._listener = None
+        self._pool = None
+        self._handler: MessageHandler | None = None
+        self._reconnect_task: asyncio.Task | None = None
+        # Running deliveries, referenced so they aren't garbage collected
+        self._deliveries: set[asyncio.Task] = set()
+
+    async def start(self, handler: MessageHandler):
+        import asyncpg
+
+        self._handler = handler
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+        await self._listen()
+
+    async def _listen(self):
+        import asyncpg
+
+        self._listener = await asyncpg.connect(self.dsn)
+        self._listener.add_termination_listener(self._on_terminated)
+        await self._listener.add_listener(self.channel, self._on_notification)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        task = asyncio.create_task(dispatch(self._handler, payload))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    def _on_terminated(self, connection):
+        if self._handler is not None:
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        while True:
+            await asyncio.sleep(self.retry_delay)
+            try:
+                await self._listen()
+                return
+            except Exception:
+                logger.exception(f"Could not listen to {self.channel}, retrying")
+
+    async def publish(self, message: dict):
+        await self._pool.execute(
+            "SELECT pg_notify($1, $2)", self.channel, json.dumps(message)
+        )
+
+    async def stop(self):
+        self._handler = None
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._listener is not None:
+            await self._listener.close()
+        if self._pool is not None:
+            await self._pool.close()
+
+
+async def dispatch(handler: MessageHandler, payload: str | bytes):
+    try:
+        await handler(json.loads(payload))
+    except Exception:
+        logger.exception("Could not deliver a backplane message")
+
+
+def create_backplane() -> Backplane:
+    channel = settings.socket_backplane_channel
+    if settings.socket_backplane == "redis":
+        return RedisBackplane(settings.cache_redis_url, channel)
+    if settings.socket_backplane == "postgres":
+        url = make_url(settings.database_url).set(drivername="postgresql")
+        return PostgresBackplane(url.render_as_string(hide_password=False), channel)
+    return MemoryBackplane()
+
+
+class Connection:
+    """
+    A socket with its own bounded send queue, drained by a writer task so a
+    slow client only ever delays itself.
+    """
+
+    def __init__(self, websocket: WebSocket, username: str, queue_size: int):
+        self.websocket = websocket
+        self.username = username
+        self.queue: asyncio.Queue[str] = asyncio.Queue(queue_size)
+        self.task: asyncio.Task | None = None
+        self.last_seen = asyncio.get_running_loop().time()
+
+    def touch(self):
+        """Records that the client is alive, any message it sends counts."""
+        self.last_seen = asyncio.get_running_loop().time()
+
+    def offer(self, message: str) -> bool:
+        """Queues a message, False when the client is too far behind."""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+
+class ConnectionManager:
+    """
+    Tracks the WebSocket connections of this worker. Messages are published
+    on the backplane, so they reach the user whichever worker it is
+    connected to, and delivered by every worker to its own connections.
+
+    Delivery only queues the message on every matching connection, the
+    sends happen concurrently in the connection writer tasks. Connections
+    whose queue is full, or whose send fails or times out, are dropped.
+
+    Every heartbeat interval the clients are sent a ping, connections that
+    sent nothing for the idle timeout are closed, so half-open sockets
+    don't pile up. The number of connections is capped per user (the oldest
+    one is closed) and per worker (new ones are refused).
+    """
+
+    def __init__(
+        self,
+        backplane: Backplane | None = None,
+        queue_size: int = settings.socket_send_queue_size,
+        send_timeout: float = settings.socket_send_timeout_seconds,
+        heartbeat_interval: float = settings.socket_heartbeat_interval_seconds,
+        idle_timeout: float = settings.socket_idle_timeout_seconds,
+        max_connections_per_user: int = settings.socket_max_connections_per_user,
+        max_connections: int = settings.socket_max_connections,
+    ):
+        self.active_connections: Dict[str, List[Connection]] = {}
+        self.backplane = backplane or MemoryBackplane()
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.max_connections_per_user = max_connections_per_user
+        self.max_connections = max_connections
+        self.connection_count = 0
+        self.rejected = 0
+        self.replaced = 0
+        self.evicted_slow = 0
+        self.reaped_idle = 0
+        self.dropped = 0
+        self._closing: set[asyncio.Task] = set()
+        self._heartbeat_task: asyncio.Task | None = None
+
+    async def start(self):
+        await self.backplane.start(self.deliver)
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        await self.backplane.stop()
+        await asyncio.gather(
+            *(self.close(connection) for connection in self._connections())
+        )
+
+    async def connect(self, websocket: WebSocket, username: str) -> Connection | None:
+        """Accepts a socket, or refuses it and returns None when full."""
+        if self.connection_count >= self.max_connections:
+            self.rejected += 1
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return None
 
-    async def connect(self, websocket: WebSocket, username: str):
         await websocket.accept()
+        connection = Connection(websocket, username, self.queue_size)
+        connection.task = asyncio.create_task(self._write(connection))
         if username not in self.active_connections:
             self.active_connections[username] = []
-        self.active_connections[username].append(websocket)
+        connections = self.active_connections[username]
+        while len(connections) >= self.max_connections_per_user:
+            self.replaced += 1
+            self._close_later(connections[0], status.WS_1008_POLICY_VIOLATION)
+        connections.append(connection)
+        self.connection_count += 1
+        return connection
 
     def disconnect(self, websocket: WebSocket, username: str):
-        self.active_connections[username].remove(websocket)
-        if not self.active_connections[username]:
-            del self.active_connections[username]
+        for connection in self.active_connections.get(username, ()):
+            if connection.websocket is websocket:
+                self._remove(connection)
+                connection.task.cancel()
+                return
+
+    def _remove(self, connection: Connection) -> bool:
+        connections = self.active_connections.get(connection.username, [])
+        if connection not in connections:
+            return False
+        connections.remove(connection)
+        if not connections:
+            del self.active_connections[connection.username]
+        self.connection_count -= 1
+        return True
+
+    def _connections(self) -> list[Connection]:
+        return [
+            connection
+            for connections in self.active_connections.values()
+            for connection in connections
+        ]
+
+    def _close_later(self, connection: Connection, code: int):
+        # Closed in the background, the close frame may be slow to send too
+        self._remove(connection)
+        task = asyncio.create_task(self.close(connection, code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            idle_since = loop.time() - self.idle_timeout
+            for connection in self._connections():
+                if connection.last_seen < idle_since:
+                    self.reaped_idle += 1
+                    self._close_later(connection, status.WS_1001_GOING_AWAY)
+                elif not connection.offer(PING):
+                    self.evicted_slow += 1
+                    self._close_later(connection, status.WS_1013_TRY_AGAIN_LATER)
+
+    async def _write(self, connection: Connection):
+        while True:
+            message = await connection.queue.get()
+            try:
+                await asyncio.wait_for(
+                    connection.websocket.send_text(message), self.send_timeout
+                )
+            except Exception as e:
+                logger.info(f"Dropping a connection of {connection.username}: {e!r}")
+                if self._remove(connection):
+                    self.dropped += 1
+                    # Closed as well, the endpoint would otherwise keep the
+                    # socket open while nothing is delivered to it anymore
+                    self._close_later(connection, status.WS_1011_INTERNAL_ERROR)
+                return
+
+    async def close(self, connection: Connection, code: int = 1000):
+        """Stops delivering to a connection and closes its socket."""
+        self._remove(connection)
+        if connection.task is not None:
+            connection.task.cancel()
+        try:
+            await asyncio.wait_for(
+                connection.websocket.close(code=code), self.send_timeout
+            )
+        except Exception:
+            # Already closed, or too slow to even take the close frame
+            pass
+
+    async def _publish(self, message: dict):
+        # Pushes are best effort, clients catch up with the delta sync, so a
+        # backplane outage must not fail the request that sent them
+        try:
+            await self.backplane.publish(message)
+        except Exception:
+            logger.exception("Could not publish a backplane message")
+
+    async def send_personal_message(self, message: str | dict, username: str):
+        await self._publish({"username": username, "message": serialize(message)})
+
+    async def broadcast(self, message: str | dict):
+        await self._publish({"username": None, "message": serialize(message)})
+
+    async def deliver(self, message: dict):
+        """Sends a backplane message to the matching connections of this worker."""
+        if message["username"] is None:
+            connections = self._connections()
+        else:
+            connections = list(self.active_connections.get(message["username"], ()))
+
+        slow = [c for c in connections if not c.offer(message["message"])]
+        if slow:
+            logger.warning(f"Evicting {len(slow)} slow WebSocket connections")
+            self.evicted_slow += len(slow)
+        for connection in slow:
+            self._close_later(connection, status.WS_1013_TRY_AGAIN_LATER)
+
+    def stats(self) -> dict:
+        """Gauges and counters of this worker's WebSocket connections."""
+        connections = self._connections()
+        return {
+            "connections": self.connection_count,
+            "users": len(self.active_connections),
+            "max_connections": self.max_connections,
+            "max_connections_per_user": self.max_connections_per_user,
+            "queued_messages": sum(c.queue.qsize() for c in connections),
+            "rejected": self.rejected,
+            "replaced": self.replaced,
+            "evicted_slow": self.evicted_slow,
+            "reaped_idle": self.reaped_idle,
+            "dropped": self.dropped,
+        }
 
-    async def send_personal_message(self, message: str, username: str):
-        if username in self.active_connections:
-            for connection in self.active_connections[username]:
-                await connection.send_text(message)
 
-    async def broadcast(self, message: str):
-        for connections in self.active_connections.values():
-            for connection in connections:
-                await connection.send_text(message)
+def serialize(message: str | dict) -> str:
+    """Messages are serialized once, every socket is sent the same text."""
+    return message if isinstance(message, str) else json.dumps(message)
 
 
-manager = ConnectionManager()
+manager = ConnectionManager(create_backplane())
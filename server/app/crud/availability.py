@@ -0,0 +1,98 @@
+import datetime
+import uuid
+from collections import defaultdict
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.cache import invalidate_slots
+from app.models.availability import Availability
+from app.models.booking import Booking
+from app.schemas.availability import RecurringAvailability
+from app.utils.slots import bookable_slots
+
+# Dialects whose INSERT supports ON CONFLICT ... DO UPDATE
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def upsert_availabilities(
+    db: Session, user_id: uuid.UUID, availabilities: list[RecurringAvailability]
+) -> None:
+    """
+    Inserts or updates the given days of a user's recurring availability with
+    a single INSERT ... ON CONFLICT (user_id, day) DO UPDATE statement.
+    """
+    # A day submitted twice would make the statement update the same row
+    # twice, which PostgreSQL rejects, so the last one wins
+    rows = {
+        availability.day: {
+            "id": uuid.uuid4(),
+            "user_id": user_id,
+            "day": availability.day,
+            "start_time": availability.start_time,
+            "end_time": availability.end_time,
+            "is_available": availability.is_available,
+        }
+        for availability in availabilities
+    }
+    if not rows:
+        return
+
+    statement = UPSERT_INSERTS[db.get_bind().dialect.name](Availability).values(
+        list(rows.values())
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[Availability.user_id, Availability.day],
+        set_={
+            "start_time": statement.excluded.start_time,
+            "end_time": statement.excluded.end_time,
+            "is_available": statement.excluded.is_available,
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(statement)
+    db.commit()
+    invalidate_slots(user_id)
+
+
+def delete_availabilities(db: Session, user_id: uuid.UUID) -> None:
+    db.execute(delete(Availability).where(Availability.user_id == user_id))
+    db.commit()
+    invalidate_slots(user_id)
+
+
+def get_bookable_slots(
+    db: Session,
+    provider_id: uuid.UUID,
+    start: datetime.date,
+    end: datetime.date,
+    duration: datetime.timedelta,
+) -> list[tuple[datetime.datetime, datetime.datetime]]:
+    """
+    Returns the free slots of a provider between `start` and `end`
+    (exclusive), expanded from its recurring availability minus its bookings
+    across all of its services.
+    """
+    windows = defaultdict(list)
+    for day, start_time, end_time in db.execute(
+        select(Availability.day, Availability.start_time, Availability.end_time).where(
+            Availability.user_id == provider_id, Availability.is_available.is_(True)
+        )
+    ):
+        windows[day.value].append((start_time, end_time))
+
+    bookings = [
+        tuple(row)
+        for row in db.execute(
+            select(Booking.booking_time, Booking.end_time).where(
+                Booking.provider_id == provider_id,
+                Booking.status != "cancelled",
+                Booking.end_time > datetime.datetime.combine(start, datetime.time.min),
+                Booking.booking_time
+                < datetime.datetime.combine(end, datetime.time.min),
+            )
+        )
+    ]
+
+    return bookable_slots(windows, bookings, start, end, duration)
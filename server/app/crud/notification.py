@@ -0,0 +1,159 @@
+import uuid
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.outbox import enqueue, outbox_dispatcher, outbox_handler
+from app.core.socket import manager
+from app.models.notification import Notification
+from app.models.user import User
+from app.schemas.notification import Notification as NotificationSchema
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+def add_notifications(
+    db: Session, user_ids: list[uuid.UUID], title: str, description: str
+):
+    """
+    Adds a notification for every user and bumps their unread counters, as
+    part of the caller's transaction so they're only stored along with the
+    change they announce. They are pushed over WebSocket through the outbox
+    once committed.
+
+    The users rows stay locked until the commit, so transactions notifying
+    the same user run one at a time from here on. Call it last, after the
+    statements that may fail or wait.
+    """
+    user_ids = list(dict.fromkeys(user_id for user_id in user_ids if user_id))
+    if not user_ids:
+        return
+
+    # Taking the next seq in the UPDATE locks the user row until commit, so
+    # a transaction that numbers a notification after another can't commit
+    # before it and a delta cursor never skips one. A table wide sequence
+    # would be drawn at insert time, in no particular commit order.
+    seqs = dict(
+        db.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values(
+                unread_notification_count=User.unread_notification_count + 1,
+                notification_seq=User.notification_seq + 1,
+            )
+            .returning(User.id, User.notification_seq)
+        ).all()
+    )
+    ids = [uuid.uuid4() for _ in seqs]
+    db.add_all(
+        Notification(
+            id=id, user_id=user_id, seq=seq, title=title, description=description
+        )
+        for id, (user_id, seq) in zip(ids, seqs.items())
+    )
+    enqueue(db, "notifications.push", {"ids": [str(id) for id in ids]})
+
+
+def load_pushed_notifications(ids: list[str]) -> list[tuple[str, dict]]:
+    db: Session = outbox_dispatcher.session_factory()
+    try:
+        rows = db.execute(
+            select(User.username, Notification)
+            .join(User, User.id == Notification.user_id)
+            .where(Notification.id.in_([uuid.UUID(id) for id in ids]))
+        ).all()
+        return [
+            (
+                username,
+                NotificationSchema.model_validate(notification).model_dump(mode="json"),
+            )
+            for username, notification in rows
+        ]
+    finally:
+        db.close()
+
+
+@outbox_handler("notifications.push")
+async def push_notifications(payload: dict):
+    """
+    Sends notifications to the connected users, the others get them on
+    their next sync.
+    """
+    notifications = await run_in_threadpool(load_pushed_notifications, payload["ids"])
+    for username, notification in notifications:
+        await manager.send_personal_message(notification, username)
+
+
+def notification_cursor(notification: Notification) -> str:
+    return encode_cursor(notification.seq)
+
+
+def unread_count(db: Session, user_id: uuid.UUID) -> int:
+    return db.scalar(select(User.unread_notification_count).where(User.id == user_id))
+
+
+def get_recent_notifications(db: Session, user_id: uuid.UUID, limit: int) -> dict:
+    """The newest notifications of a user, newest first."""
+    notifications = db.scalars(
+        select(Notification)
+        .where(Notification.user_id == user_id)
+        .order_by(Notification.seq.desc())
+        .limit(limit)
+    ).all()
+    return {
+        "items": notifications,
+        "unread_count": unread_count(db, user_id),
+        "cursor": notification_cursor(notifications[0]) if notifications else None,
+    }
+
+
+def get_notifications_since(
+    db: Session, user_id: uuid.UUID, since: str | None, limit: int
+) -> dict:
+    """
+    The notifications of a user added after the `since` cursor, oldest
+    first, so a reconnecting client only fetches what it missed. Without a
+    cursor the history is returned from the start.
+    """
+    query = select(Notification).where(Notification.user_id == user_id)
+    if since is not None:
+        (seq,) = decode_cursor(since, int)
+        query = query.where(Notification.seq > seq)
+
+    notifications = db.scalars(
+        query.order_by(Notification.seq.asc()).limit(limit + 1)
+    ).all()
+    has_more = len(notifications) > limit
+    notifications = notifications[:limit]
+    return {
+        "items": notifications,
+        "unread_count": unread_count(db, user_id),
+        "cursor": notification_cursor(notifications[-1]) if notifications else since,
+        "has_more": has_more,
+    }
+
+
+def mark_notifications_read(
+    db: Session, user_id: uuid.UUID, notification_ids: list[uuid.UUID] | None = None
+) -> int:
+    """
+    Marks notifications (every unread one when no ids are given) as read and
+    returns the new unread count. Only rows that were unread are counted, so
+    concurrent requests can't decrement the counter twice.
+    """
+    statement = update(Notification).where(
+        Notification.user_id == user_id, Notification.read.is_(False)
+    )
+    if notification_ids is not None:
+        statement = statement.where(Notification.id.in_(notification_ids))
+    marked = db.execute(
+        statement.values(read=True).execution_options(synchronize_session=False)
+    ).rowcount
+    count = db.scalar(
+        update(User)
+        .where(User.id == user_id)
+        .values(unread_notification_count=User.unread_notification_count - marked)
+        .returning(User.unread_notification_count)
+    )
+    db.commit()
+    return count
@@ -0,0 +1,50 @@
+import uuid
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core.cache import invalidate_services
+from app.crud.notification import add_notifications
+from app.models.booking import Booking
+from app.models.review import Review, rating_increments
+from app.models.service import Service
+from app.models.user import User
+from app.schemas.review import ReviewCreate
+
+
+def create_review(db: Session, booking: Booking, review: ReviewCreate) -> Review:
+    """
+    Stores a review and adds its rating to the counters of the booked service
+    and of its provider, in one transaction. The counters are incremented in
+    SQL, so concurrent reviews can't overwrite each other's updates.
+    """
+    db_review = Review(
+        id=uuid.uuid4(),
+        booking_id=booking.id,
+        service_id=booking.service_id,
+        rating=review.rating,
+        comment=review.comment,
+    )
+    db.add(db_review)
+    db.execute(
+        update(Service)
+        .where(Service.id == booking.service_id)
+        .values(rating_increments(Service, review.rating))
+    )
+    if booking.provider_id is not None:
+        db.execute(
+            update(User)
+            .where(User.id == booking.provider_id)
+            .values(rating_increments(User, review.rating))
+        )
+    add_notifications(
+        db,
+        [booking.provider_id],
+        "New review",
+        f"A customer rated your service {review.rating}/5.",
+    )
+    db.commit()
+    # The rating summaries of the service changed
+    invalidate_services(booking.service_id)
+
+    return db_review
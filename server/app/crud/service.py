@@ -1,19 +1,169 @@
 import os
-import shutil
+import uuid
 
-from sqlalchemy.orm import Session
+from fastapi import UploadFile
+from sqlalchemy import JSON, and_, cast, delete, func, insert, literal, or_, select
+from sqlalchemy import true, union_all
+from sqlalchemy.dialects.postgresql import REAL
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy_searchable import search_manager
 
-from app.models.service import Service, ServiceMedia, ServiceTag
+from app.core.cache import invalidate_services
+from app.core.config import settings
+from app.core.media_pipeline import MediaJob, media_pipeline
+from app.crud.notification import add_notifications
+from app.models.booking import Booking
+from app.models.service import (
+    MediaStatus,
+    PricingType,
+    Service,
+    ServiceMedia,
+    ServiceTag,
+)
 from app.models.user import User
 from app.schemas.service import ServiceCreate
-from app.utils.media import compress_image
+from app.utils.media import DEFAULT_MEDIA_FORMAT, store_upload, variant_filename
+from app.utils.pagination import decode_cursor, encode_cursor
 
-UPLOAD_DIRECTORY = "./files/"
-os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+UPLOAD_DIRECTORY = settings.media_directory
+ORIGINALS_DIRECTORY = settings.media_originals_directory
+os.makedirs(ORIGINALS_DIRECTORY, exist_ok=True)
+
+# Everything `schemas.service.Service` serializes. Collections are loaded with
+# one SELECT ... IN per page, the provider is joined, so listing N services
+# costs the same number of queries as listing one.
+SERVICE_SUMMARY_LOADERS = (selectinload(Service.tags), selectinload(Service.media))
+SERVICE_LOADERS = (*SERVICE_SUMMARY_LOADERS, joinedload(Service.provider))
+
+
+def get_service(db: Session, service_id: uuid.UUID) -> Service | None:
+    return db.scalars(
+        select(Service).options(*SERVICE_LOADERS).where(Service.id == service_id)
+    ).first()
+
+
+async def get_service_async(db: AsyncSession, service_id: uuid.UUID) -> Service | None:
+    return (
+        await db.scalars(
+            select(Service).options(*SERVICE_LOADERS).where(Service.id == service_id)
+        )
+    ).first()
+
+
+def store_media_files(files: list[UploadFile] | None) -> list[tuple[str, str]]:
+    """
+    Streams the uploaded files to content addressed storage and returns the
+    (content hash, path) of each. Raises `UploadTooLarge` for oversized
+    files, before anything is written to the database, and removes the files
+    it already stored then.
+    """
+    stored = []
+    try:
+        for file in files or []:
+            stored.append(
+                store_upload(
+                    file.file, ORIGINALS_DIRECTORY, settings.media_max_upload_bytes
+                )
+            )
+    except BaseException:
+        # Only the files this request added, stored content may be shared
+        for _, path, new in stored:
+            if new:
+                os.remove(path)
+        raise
+    return [(content_hash, path) for content_hash, path, _ in stored]
+
+
+def ready_media_query(content_hashes: list[str]):
+    """
+    Selects the variants of already processed media with the given hashes.
+    """
+    return select(ServiceMedia.content_hash, ServiceMedia.variants).where(
+        ServiceMedia.content_hash.in_(content_hashes),
+        ServiceMedia.status == MediaStatus.ready,
+    )
+
+
+def unique_tags(tags: list[str] | None) -> list[str]:
+    """
+    Returns the non-empty tags with surrounding whitespace and duplicates
+    removed, keeping their original order.
+    """
+    return list(dict.fromkeys(tag.strip() for tag in tags or [] if tag.strip()))
+
+
+def diff_tags(
+    existing: list[tuple[uuid.UUID, str]], tags: list[str]
+) -> tuple[list[uuid.UUID], list[str]]:
+    """
+    Compares the (id, text) rows currently stored for a service against the
+    requested tags and returns the ids to delete and the texts to insert.
+    """
+    kept = set()
+    removed_ids = []
+    for tag_id, text in existing:
+        if text in tags and text not in kept:
+            kept.add(text)
+        else:
+            removed_ids.append(tag_id)
+
+    return removed_ids, [tag for tag in tags if tag not in kept]
+
+
+def tags_text(tags: list[str]) -> str:
+    return " ".join(tags)
+
+
+def tag_rows(service_id: uuid.UUID, tags: list[str]) -> list[dict]:
+    return [{"id": uuid.uuid4(), "text": tag, "service_id": service_id} for tag in tags]
+
+
+def media_rows(
+    service_id: uuid.UUID,
+    uploads: list[tuple[str, str]],
+    ready_variants: dict[str, dict],
+) -> tuple[list[dict], list[MediaJob]]:
+    """
+    Returns the media rows to insert for the stored uploads, along with the
+    jobs to submit once they're committed. Content that was already
+    processed is reused as is, the rest starts in the `processing` state.
+    """
+    rows, jobs = [], []
+    for content_hash, path in uploads:
+        variants = ready_variants.get(content_hash)
+        rows.append(
+            {
+                "id": uuid.uuid4(),
+                # Where the full size variant is, or will be once generated
+                "url": variant_filename(content_hash, "full", DEFAULT_MEDIA_FORMAT),
+                "service_id": service_id,
+                "content_hash": content_hash,
+                "status": MediaStatus.ready if variants else MediaStatus.processing,
+                "variants": variants,
+            }
+        )
+        if not variants:
+            jobs.append(MediaJob(content_hash, path, UPLOAD_DIRECTORY))
+    return rows, jobs
+
+
+def upcoming_customers_query(service_id: uuid.UUID):
+    """Customers with an upcoming booking of the service."""
+    return (
+        select(Booking.customer_id)
+        .where(
+            Booking.service_id == service_id,
+            Booking.status != "cancelled",
+            Booking.booking_time >= func.now(),
+        )
+        .distinct()
+    )
 
 
 def create_service(db: Session, user: User, service: ServiceCreate) -> Service:
     db_service = Service(
+        id=uuid.uuid4(),
         title=service.title,
         description=service.description,
         category=service.category,
@@ -21,90 +171,300 @@ def create_service(db: Session, user: User, service: ServiceCreate) -> Service:
         pricing=service.pricing,
         pricing_type=service.pricing_type,
         provider_id=user.id,
+        tags_text=tags_text(unique_tags(service.tags)),
     )
 
-    db.add(db_service)
-    db.commit()
+    # Files are written before anything is sent to the database so the
+    # transaction isn't held open while they're stored
+    uploads = store_media_files(service.media)
+    new_tags = tag_rows(db_service.id, unique_tags(service.tags))
 
-    for tag in service.tags:
-        tag = ServiceTag(text=tag, service_id=db_service.id)
-        db.add(tag)
-        db.commit()
-
-    for file in service.media:
-        media = ServiceMedia(url="", service_id=db_service.id)
-        db.add(media)
-        db.commit()
-        db.refresh(media)
-
-        # Define the file paths
-        file_extension = file.filename.split(".")[-1]
-        file_location = os.path.join(UPLOAD_DIRECTORY, f"{media.id}.{file_extension}")
-        compressed_file_location = os.path.join(
-            UPLOAD_DIRECTORY, f"{media.id}_compressed.{file_extension}"
+    ready_variants = {}
+    if uploads:
+        ready_variants = dict(
+            db.execute(ready_media_query([upload[0] for upload in uploads])).all()
         )
+    new_media, media_jobs = media_rows(db_service.id, uploads, ready_variants)
 
-        # Save the uploaded file
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Compress the image
-        compress_image(file_location, compressed_file_location)
+    db.add(db_service)
+    db.flush()
 
-        # Update the media item URL to the compressed file path
-        media.url = f"{media.id}_compressed.{file_extension}"
-        db.add(media)
+    if new_tags:
+        db.execute(insert(ServiceTag), new_tags)
+    if new_media:
+        db.execute(insert(ServiceMedia), new_media)
 
     db.commit()
+    invalidate_services()
+    media_pipeline.submit(media_jobs)
 
     return db_service
 
 
 def update_service(db: Session, db_service: Service, service: ServiceCreate) -> Service:
+    service_id = db_service.id
+    uploads = store_media_files(service.media)
+
+    ready_variants = {}
+    if uploads:
+        ready_variants = dict(
+            db.execute(ready_media_query([upload[0] for upload in uploads])).all()
+        )
+    new_media, media_jobs = media_rows(db_service.id, uploads, ready_variants)
+
     db_service.title = service.title
     db_service.description = service.description
     db_service.category = service.category
     db_service.location = service.location
     db_service.pricing = service.pricing
     db_service.pricing_type = service.pricing_type
+    db_service.tags_text = tags_text(unique_tags(service.tags))
 
-    for tag in db_service.tags:
-        print("TAG:", tag)
-        db.delete(tag)
-
-    for media in db_service.media:
-        print("MEDIA:", media)
-        db.delete(media)
-
-    for tag in service.tags:
-        tag = ServiceTag(text=tag, service_id=db_service.id)
-        db.add(tag)
-        db.commit()
-
-    for file in service.media:
-        media = ServiceMedia(url="", service_id=db_service.id)
-        db.add(media)
-        db.commit()
-        db.refresh(media)
-
-        # Define the file paths
-        file_extension = file.filename.split(".")[-1]
-        file_location = os.path.join(UPLOAD_DIRECTORY, f"{media.id}.{file_extension}")
-        compressed_file_location = os.path.join(
-            UPLOAD_DIRECTORY, f"{media.id}_compressed.{file_extension}"
+    existing_tags = db.execute(
+        select(ServiceTag.id, ServiceTag.text).where(
+            ServiceTag.service_id == db_service.id
         )
+    ).all()
+    removed_tag_ids, added_tags = diff_tags(existing_tags, unique_tags(service.tags))
 
-        # Save the uploaded file
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Compress the image
-        compress_image(file_location, compressed_file_location)
+    if removed_tag_ids:
+        db.execute(delete(ServiceTag).where(ServiceTag.id.in_(removed_tag_ids)))
+    if added_tags:
+        db.execute(insert(ServiceTag), tag_rows(db_service.id, added_tags))
 
-        # Update the media item URL to the compressed file path
-        media.url = f"{media.id}_compressed.{file_extension}"
-        db.add(media)
+    db.execute(delete(ServiceMedia).where(ServiceMedia.service_id == db_service.id))
+    if new_media:
+        db.execute(insert(ServiceMedia), new_media)
 
+    add_notifications(
+        db,
+        db.scalars(upcoming_customers_query(service_id)).all(),
+        "Service update",
+        f"{service.title} was updated by its provider.",
+    )
     db.commit()
+    invalidate_services(service_id)
+    media_pipeline.submit(media_jobs)
 
     return db_service
+
+
+def delete_service(db: Session, db_service: Service):
+    service_id = db_service.id
+    db.delete(db_service)
+    db.commit()
+    invalidate_services(service_id)
+
+
+def facet_counts(column, *where):
+    """
+    Selects a {value: count} JSON object of the matches per `column` value.
+    Rows without a value aren't counted, json_object_agg rejects NULL keys.
+    """
+    counts = (
+        select(column.label("value"), func.count().label("count"))
+        .where(column.is_not(None), *where)
+        .group_by(column)
+        .subquery()
+    )
+    return select(
+        func.coalesce(
+            func.json_object_agg(counts.c.value, counts.c.count),
+            func.json_build_object(),
+            type_=JSON,
+        )
+    ).scalar_subquery()
+
+
+def search_statement(
+    term: str,
+    category: str | None = None,
+    pricing_type: PricingType | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    cursor: str | None = None,
+    limit: int = settings.page_size_default,
+):
+    """
+    Builds the statement of `find_services`. Rows hold both facets, then
+    the page: (category_facets, pricing_type_facets, Service, rank).
+
+    The term is matched against `search_vector` as is, tags included, so
+    the match is served by its GIN index.
+    """
+    regconfig = search_manager.options["regconfig"]
+
+    filters = []
+    if min_price is not None:
+        filters.append(Service.pricing >= min_price)
+    if max_price is not None:
+        filters.append(Service.pricing <= max_price)
+    if term.strip():
+        tsquery = func.parse_websearch(regconfig, term)
+        filters.append(Service.search_vector.op("@@")(tsquery))
+        rank = func.ts_rank(Service.search_vector, tsquery, type_=REAL)
+    else:
+        rank = cast(literal(0), REAL)
+
+    matches = (
+        select(Service.id, Service.category, Service.pricing_type, rank.label("rank"))
+        .where(*filters)
+        .cte("matches")
+    )
+    category_filter = matches.c.category == category if category else true()
+    pricing_type_filter = (
+        matches.c.pricing_type == pricing_type if pricing_type else true()
+    )
+
+    facets = select(
+        facet_counts(matches.c.category, pricing_type_filter).label("category_facets"),
+        facet_counts(matches.c.pricing_type, category_filter).label(
+            "pricing_type_facets"
+        ),
+    ).subquery("facets")
+
+    page = select(matches.c.id, matches.c.rank).where(
+        category_filter, pricing_type_filter
+    )
+    if cursor is not None:
+        last_rank, last_id = decode_cursor(cursor, float, uuid.UUID)
+        # Compare as REAL, the precision ts_rank is computed in
+        last_rank = cast(last_rank, REAL)
+        page = page.where(
+            or_(
+                matches.c.rank < last_rank,
+                and_(matches.c.rank == last_rank, matches.c.id > last_id),
+            )
+        )
+    page = (
+        page.order_by(matches.c.rank.desc(), matches.c.id)
+        .limit(limit + 1)
+        .subquery("page")
+    )
+
+    # Outer joins keep the facets row even when the page is empty
+    return (
+        select(
+            facets.c.category_facets,
+            facets.c.pricing_type_facets,
+            Service,
+            page.c.rank,
+        )
+        .select_from(facets)
+        .outerjoin(page, true())
+        .outerjoin(Service, Service.id == page.c.id)
+        .order_by(page.c.rank.desc(), page.c.id)
+        .options(*SERVICE_LOADERS)
+    )
+
+
+def find_services(
+    db: Session,
+    term: str,
+    category: str | None = None,
+    pricing_type: PricingType | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    cursor: str | None = None,
+    limit: int = settings.page_size_default,
+) -> dict:
+    """
+    Public full text search over the title, description, category, location
+    and tags of every service, ranked by relevance (`ts_rank`).
+
+    Returns a page of services together with the number of matches per
+    category and pricing type, both read by a single statement. Each facet
+    ignores its own filter, so the other options still show their counts
+    once one is selected. An empty term matches every service.
+    """
+    rows = db.execute(
+        search_statement(
+            term, category, pricing_type, min_price, max_price, cursor, limit
+        )
+    ).all()
+    return search_result(rows, limit)
+
+
+async def find_services_async(
+    db: AsyncSession,
+    term: str,
+    category: str | None = None,
+    pricing_type: PricingType | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    cursor: str | None = None,
+    limit: int = settings.page_size_default,
+) -> dict:
+    """`find_services` on an AsyncSession."""
+    rows = (
+        await db.execute(
+            search_statement(
+                term, category, pricing_type, min_price, max_price, cursor, limit
+            )
+        )
+    ).all()
+    return search_result(rows, limit)
+
+
+def search_result(rows: list, limit: int) -> dict:
+    hits = [row for row in rows if row.Service is not None]
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = encode_cursor(hits[-1].rank, hits[-1].Service.id)
+
+    return {
+        "items": [row.Service for row in hits],
+        "next_cursor": next_cursor,
+        "facets": {
+            "category": rows[0].category_facets,
+            "pricing_type": rows[0].pricing_type_facets,
+        },
+    }
+
+
+def suggest_statement(prefix: str, limit: int):
+    """
+    Builds the statement of `suggest_services`, selecting (text, kind).
+
+    `word_similarity` scores the prefix against the closest run of words in
+    each value, so partial words ("plumb") and typos ("electrcian") match.
+    The `<%` filter is served by the trigram indexes.
+    """
+    sources = [
+        ("title", Service.title),
+        ("category", Service.category),
+        ("location", Service.location),
+        ("tag", ServiceTag.text),
+    ]
+    candidates = union_all(
+        *(
+            select(
+                column.label("text"),
+                literal(kind).label("kind"),
+                func.word_similarity(prefix, column).label("score"),
+            ).where(literal(prefix).op("<%")(column))
+            for kind, column in sources
+        )
+    ).subquery()
+
+    score = func.max(candidates.c.score)
+    return (
+        select(candidates.c.text, candidates.c.kind)
+        .group_by(candidates.c.text, candidates.c.kind)
+        .order_by(score.desc(), func.length(candidates.c.text), candidates.c.text)
+        .limit(limit)
+    )
+
+
+def suggest_services(db: Session, prefix: str, limit: int) -> list[dict]:
+    """
+    Returns titles, categories, locations and tags resembling what the user
+    has typed so far, best matches first.
+    """
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+
+    rows = db.execute(suggest_statement(prefix, limit)).all()
+    return [{"text": row.text, "kind": row.kind} for row in rows]
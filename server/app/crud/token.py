@@ -1,15 +1,34 @@
+import uuid
+
 from sqlalchemy.orm import Session
 
+from app.core.outbox import enqueue
 from app.models.token import TokenType, Token
 from app.models.user import User
 
+# Outbox topic of the email carrying each type of token
+TOKEN_EMAIL_TOPICS = {
+    TokenType.verify_email: "email.verify_email",
+    TokenType.reset_password: "email.reset_password",
+}
+
+
+def new_token(db: Session, user: User, token_type: TokenType) -> Token:
+    """Adds a token and the outbox event emailing it to the user."""
+    token = Token(id=uuid.uuid4(), type=token_type, user_id=user.id)
+    db.add(token)
+    enqueue(
+        db,
+        TOKEN_EMAIL_TOPICS[token_type],
+        {"name": user.name, "email": user.email, "token": str(token.id)},
+    )
+    return token
+
 
 def create_token(
     db: Session, user: User, token_type: TokenType = TokenType.reset_password
 ):
-    token = Token(type=token_type, user_id=user.id)
-
-    db.add(token)
+    token = new_token(db, user, token_type)
     db.commit()
 
     return token
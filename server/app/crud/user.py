@@ -1,16 +1,15 @@
 from sqlalchemy.orm import Session
 
-from app.core.security import get_password_hash
 from app.models.user import User
 from app.schemas.user import UserCreate
 
 
-def create_user(db: Session, user: UserCreate) -> User:
+def create_user(db: Session, user: UserCreate, hashed_password: str) -> User:
     db_user = User(
         username=user.username,
         name=user.name,
         email=user.email,
-        hashed_password=get_password_hash(user.password),
+        hashed_password=hashed_password,
         role=user.role,
     )
 
@@ -1,18 +1,121 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
+from app.db.pool import TimedAsyncAdaptedQueuePool, TimedQueuePool
 
 SQLALCHEMY_DATABASE_URL = settings.database_url
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+def get_engine_options(url: str, poolclass: type) -> dict:
+    """
+    Returns the pool configuration for an engine. SQLite picks its own pool
+    implementation and doesn't accept the sizing arguments, so it only
+    gets the defaults.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    **get_engine_options(SQLALCHEMY_DATABASE_URL, TimedQueuePool),
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def get_async_database_url() -> str:
+    """
+    Returns the URL used by the async engine. An explicit
+    `async_database_url` wins, otherwise the synchronous URL is reused with
+    its driver swapped for asyncpg (or aiosqlite for local SQLite files).
+    """
+    if settings.async_database_url:
+        return settings.async_database_url
+
+    url = make_url(SQLALCHEMY_DATABASE_URL)
+    if url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
+async_engine: AsyncEngine | None = None
+AsyncSessionLocal: async_sessionmaker[AsyncSession] | None = None
+
+if settings.async_database:
+    async_engine = create_async_engine(
+        get_async_database_url(),
+        **get_engine_options(get_async_database_url(), TimedAsyncAdaptedQueuePool),
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+class ThreadpoolSession:
+    """
+    The part of the `AsyncSession` API the async crud uses, on top of a sync
+    `Session` whose calls run in the threadpool. Lets the async routes work
+    while ASYNC_DATABASE is off. Results are buffered before they're returned,
+    like `AsyncSession` does, so reading them doesn't touch the connection.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def execute(self, statement, *args, **kwargs):
+        result = await run_in_threadpool(
+            lambda: self.sync_session.execute(statement, *args, **kwargs).freeze()
+        )
+        return result()
+
+    async def scalars(self, statement, *args, **kwargs):
+        return (await self.execute(statement, *args, **kwargs)).scalars()
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.scalar, statement, *args, **kwargs
+        )
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError(
+            "Async database access is disabled, set ASYNC_DATABASE=true to enable it"
+        )
+
+    async with AsyncSessionLocal() as db:
+        yield db
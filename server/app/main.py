@@ -1,6 +1,9 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
 from app.api.endpoints import (
     users,
@@ -10,9 +13,32 @@ from app.api.endpoints import (
     admin,
     notifications,
     availability,
+    files,
 )
+from app.core.config import settings
+from app.core.media_pipeline import media_pipeline
+from app.core.outbox import outbox_dispatcher
+from app.core.security import PasswordHasherBusy
+from app.core.socket import manager
+from app.utils import mail  # noqa, registers the outbox email handlers
+from app.utils.http import MultipartSizeLimitMiddleware
+from app.utils.media import UploadTooLarge
+from app.utils.pagination import InvalidCursor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await manager.start()
+    if settings.outbox_dispatcher_enabled:
+        await outbox_dispatcher.start()
+    await run_in_threadpool(media_pipeline.resume)
+    yield
+    await outbox_dispatcher.stop()
+    await manager.stop()
+    media_pipeline.shutdown()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -24,6 +50,7 @@ app.add_middleware(
 )
 
 api_v1 = FastAPI()
+api_v1.add_middleware(MultipartSizeLimitMiddleware)
 
 # Include routers
 api_v1.include_router(users.router, prefix="/users", tags=["users"])
@@ -38,7 +65,27 @@ api_v1.include_router(
     notifications.router, prefix="/notifications", tags=["notifications"]
 )
 
-api_v1.mount("/files", StaticFiles(directory="./files/"), name="files")
+
+@api_v1.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many requests, please try again"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@api_v1.exception_handler(UploadTooLarge)
+async def upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+
+@api_v1.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": "Invalid cursor"})
+
+
+api_v1.include_router(files.router, prefix="/files", tags=["files"])
 
 app.mount("/api/v1", api_v1)
 
@@ -0,0 +1,4 @@
+# Import every model so relationships declared by class name can be resolved
+# whichever model module is imported first
+from app.models import availability, booking, notification, outbox  # noqa
+from app.models import review, service, token, user  # noqa
@@ -11,6 +11,7 @@ from sqlalchemy import (
     func,
     Time,
     ForeignKey,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 
@@ -38,3 +39,10 @@ class Availability(Base):
     is_available = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # One row per user and day, the target of the availability upsert
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id", "day", name="uq_recurring_availabilities_user_id_day"
+        ),
+    )
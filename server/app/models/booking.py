@@ -1,6 +1,7 @@
 import uuid
 
-from sqlalchemy import Column, ForeignKey, String, UUID, DateTime, func
+from sqlalchemy import Column, ForeignKey, Index, String, UUID, DateTime, func, text
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import relationship
 
 from app.db.session import Base
@@ -8,12 +9,35 @@ from app.db.session import Base
 
 class Booking(Base):
     __tablename__ = "bookings"
-    id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid)
+    id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
     service_id = Column(UUID(as_uuid=True), ForeignKey("services.id"))
     customer_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    # Copied from the service so overlaps can be constrained per provider
+    provider_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     booking_time = Column(DateTime)
+    end_time = Column(DateTime, nullable=False)
     status = Column(String, default="pending")
     service = relationship("Service", back_populates="bookings")
-    customer = relationship("User")
+    customer = relationship("User", foreign_keys=[customer_id])
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # Availability checks only look at bookings that still hold a slot
+        Index(
+            "ix_bookings_service_id_booking_time_active",
+            "service_id",
+            "booking_time",
+            postgresql_where=text("status <> 'cancelled'"),
+        ),
+        Index("ix_bookings_customer_id_booking_time", "customer_id", "booking_time"),
+        # A provider can't hold two active bookings over the same time, even
+        # when they are inserted concurrently (needs the btree_gist extension)
+        ExcludeConstraint(
+            ("provider_id", "="),
+            (text("tsrange(booking_time, end_time, '[)')"), "&&"),
+            name="ex_bookings_provider_id_time_range",
+            using="gist",
+            where=text("status <> 'cancelled'"),
+        ).ddl_if(dialect="postgresql"),
+    )
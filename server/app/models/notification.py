@@ -0,0 +1,26 @@
+import uuid
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy import UUID, false, func
+
+from app.db.session import Base
+
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    # Position among the user's notifications, in commit order, see
+    # `crud.notification.add_notifications`
+    seq = Column(Integer, nullable=False)
+    title = Column(String, nullable=False)
+    description = Column(String, nullable=False)
+    read = Column(Boolean, nullable=False, default=False, server_default=false())
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    # A user's notifications in seq cursor order
+    __table_args__ = (
+        Index("ix_notifications_user_id_seq", "user_id", "seq", unique=True),
+    )
@@ -0,0 +1,40 @@
+import datetime
+import uuid
+
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, UUID, text
+
+from app.db.session import Base
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class OutboxEvent(Base):
+    """
+    A side effect (email, push, ...) recorded in the same transaction as the
+    change that causes it, and carried out afterwards by
+    `core.outbox.OutboxDispatcher`.
+    """
+
+    __tablename__ = "outbox_events"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    topic = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(String)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    # Not claimable before then: set for retries and while a worker holds it
+    available_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    processed_at = Column(DateTime(timezone=True))
+    failed_at = Column(DateTime(timezone=True))
+
+    # Only the pending events are indexed, the dispatcher claims them in order
+    __table_args__ = (
+        Index(
+            "ix_outbox_events_pending",
+            "available_at",
+            postgresql_where=text("processed_at IS NULL AND failed_at IS NULL"),
+            sqlite_where=text("processed_at IS NULL AND failed_at IS NULL"),
+        ),
+    )
@@ -5,10 +5,41 @@ from sqlalchemy import Column, Integer, String, ForeignKey, UUID, DateTime, func
 from app.db.session import Base
 
 
+RATINGS = range(1, 6)
+
+
+class RatingAggregates:
+    """
+    Review counters of a service or provider, incremented in the same
+    transaction as each review (see `crud.review.create_review`) so averages
+    and histograms never need an aggregation query.
+    """
+
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_1_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_2_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_3_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_4_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_5_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+def rating_increments(model: type[RatingAggregates], rating: int) -> dict:
+    """UPDATE values adding one review of `rating` to the counters of `model`."""
+    histogram_column = getattr(model, f"rating_{rating}_count")
+    return {
+        model.rating_count: model.rating_count + 1,
+        model.rating_sum: model.rating_sum + rating,
+        histogram_column: histogram_column + 1,
+    }
+
+
 class Review(Base):
     __tablename__ = "reviews"
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
-    booking_id = Column(UUID(as_uuid=True), ForeignKey("bookings.id"))
+    booking_id = Column(UUID(as_uuid=True), ForeignKey("bookings.id"), index=True)
+    # Copied from the booking so a service's reviews are one index scan away
+    service_id = Column(UUID(as_uuid=True), ForeignKey("services.id"), index=True)
     rating = Column(Integer)
     comment = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -11,10 +11,13 @@ from sqlalchemy import (
     Enum,
     Float,
     CheckConstraint,
+    Index,
+    JSON,
 )
 from sqlalchemy.orm import relationship
 
 from app.db.session import Base
+from app.models.review import RatingAggregates
 
 
 class PricingType(str, enum.Enum):
@@ -22,11 +25,35 @@ class PricingType(str, enum.Enum):
     hourly = "hourly"
 
 
+def trigram_index(name: str, column: str) -> Index:
+    # Requires the pg_trgm extension, serves the similarity operators (%, <%)
+    # used by autocomplete as well as ILIKE '%...%'
+    return Index(
+        name, column, postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"}
+    )
+
+
+class MediaStatus(str, enum.Enum):
+    processing = "processing"
+    ready = "ready"
+    failed = "failed"
+
+
 class ServiceMedia(Base):
     __tablename__ = "services_media"
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
     url = Column(String, nullable=False)
-    service_id = Column(UUID(as_uuid=True), ForeignKey("services.id"))
+    status = Column(
+        Enum(MediaStatus),
+        nullable=False,
+        default=MediaStatus.processing,
+        server_default=MediaStatus.ready.value,
+    )
+    # {variant: {format: file name}}, see `utils.media.generate_variants`
+    variants = Column(JSON)
+    # SHA-256 of the original upload, rows with the same content share files
+    content_hash = Column(String(64), index=True)
+    service_id = Column(UUID(as_uuid=True), ForeignKey("services.id"), index=True)
     service = relationship("Service", back_populates="media")
 
 
@@ -34,9 +61,11 @@ class ServiceTag(Base):
     __tablename__ = "services_tags"
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
     text = Column(String)
-    service_id = Column(UUID(as_uuid=True), ForeignKey("services.id"))
+    service_id = Column(UUID(as_uuid=True), ForeignKey("services.id"), index=True)
     service = relationship("Service", back_populates="tags")
 
+    __table_args__ = (trigram_index("ix_services_tags_text_trgm", "text"),)
+
 
 # class Service(Base):
 #     __tablename__ = "services"
@@ -64,12 +93,12 @@ from sqlalchemy_utils.types import TSVectorType
 make_searchable(Base.metadata)
 
 
-class Service(Base):
+class Service(RatingAggregates, Base):
     __tablename__ = "services"
 
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
     title = Column(String, index=True)
-    description = Column(String, index=True)
+    description = Column(String)
     category = Column(String, index=True)
     pricing = Column(Float, nullable=False)
     pricing_type = Column(Enum(PricingType), index=True)
@@ -81,6 +110,19 @@ class Service(Base):
     bookings = relationship("Booking", back_populates="service")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    search_vector = Column(TSVectorType("title", "description", "category", "location"))
-
-    __table_args__ = (CheckConstraint("pricing > 0", name="check_price"),)
+    # The tags joined by spaces, kept in sync by crud.service so they can be
+    # part of the indexed search vector
+    tags_text = Column(String)
+    search_vector = Column(
+        TSVectorType("title", "description", "category", "location", "tags_text")
+    )
+
+    __table_args__ = (
+        CheckConstraint("pricing > 0", name="check_price"),
+        # Listing a provider's services, in cursor order
+        Index("ix_services_provider_id_created_at", "provider_id", "created_at", "id"),
+        Index("ix_services_created_at_id", "created_at", "id"),
+        trigram_index("ix_services_title_trgm", "title"),
+        trigram_index("ix_services_category_trgm", "category"),
+        trigram_index("ix_services_location_trgm", "location"),
+    )
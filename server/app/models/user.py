@@ -1,10 +1,12 @@
 import enum
 import uuid
 
-from sqlalchemy import Column, String, Boolean, UUID, Enum, DateTime, func
+from sqlalchemy import Column, String, Boolean, UUID, Enum, DateTime, func, Integer
+from sqlalchemy import Index
 from sqlalchemy.orm import relationship
 
 from app.db.session import Base
+from app.models.review import RatingAggregates
 
 
 class UserRole(str, enum.Enum):
@@ -13,7 +15,7 @@ class UserRole(str, enum.Enum):
     provider = "provider"
 
 
-class User(Base):
+class User(RatingAggregates, Base):
     __tablename__ = "users"
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
     username = Column(String, unique=True, index=True)
@@ -22,7 +24,18 @@ class User(Base):
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
     role = Column(Enum(UserRole), default=UserRole.customer)
+    # Embedded in access tokens, bumping it revokes every token issued before
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Kept in step with the notifications by `crud.notification`
+    unread_notification_count = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # seq of the user's last notification
+    notification_seq = Column(Integer, nullable=False, default=0, server_default="0")
     services = relationship("Service", back_populates="provider")
     recurring_availabilities = relationship("Availability", back_populates="user")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Admin listing, in cursor order
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
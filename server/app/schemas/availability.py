@@ -25,3 +25,8 @@ class RecurringAvailability(BaseModel):
 
 class RecurringAvailabilityRequestBody(BaseModel):
     availabilities: list[RecurringAvailability]
+
+
+class BookableSlot(BaseModel):
+    start: datetime.datetime
+    end: datetime.datetime
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.schemas.service import Service
 from app.schemas.user import User
@@ -13,10 +13,13 @@ class BookingBase(BaseModel):
 
 class BookingCreate(BookingBase):
     service_id: uuid.UUID
+    # Defaults to settings.booking_duration_minutes
+    duration_minutes: int | None = Field(None, ge=5, le=24 * 60)
 
 
 class Booking(BookingBase):
     id: uuid.UUID
+    end_time: datetime
     service: Service
     customer: User
     status: str
@@ -0,0 +1,32 @@
+import datetime
+import uuid
+
+from pydantic import BaseModel
+
+
+class Notification(BaseModel):
+    id: uuid.UUID
+    title: str
+    description: str
+    read: bool
+    created_at: datetime.datetime
+
+    model_config = {"from_attributes": True}
+
+
+class NotificationFeed(BaseModel):
+    """
+    Notifications of the current user with its unread count. `cursor` points
+    after the newest notification the client has seen, pass it as `since`
+    to fetch only what was added afterwards.
+    """
+
+    items: list[Notification]
+    unread_count: int
+    cursor: str | None
+    has_more: bool = False
+
+
+class NotificationsRead(BaseModel):
+    # Every unread notification when omitted
+    ids: list[uuid.UUID] | None = None
@@ -1,10 +1,12 @@
 import uuid
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, computed_field
+
+from app.models.review import RATINGS
 
 
 class ReviewBase(BaseModel):
-    rating: int
+    rating: int = Field(ge=1, le=5)
     comment: str
 
 
@@ -14,5 +16,31 @@ class ReviewCreate(ReviewBase):
 
 class Review(ReviewBase):
     id: uuid.UUID
+    booking_id: uuid.UUID
+    service_id: uuid.UUID | None
 
     model_config = {"from_attributes": True}
+
+
+class RatingSummary(BaseModel):
+    """Average and histogram computed from the `RatingAggregates` counters."""
+
+    rating_count: int = 0
+    rating_sum: int = Field(0, exclude=True)
+    rating_1_count: int = Field(0, exclude=True)
+    rating_2_count: int = Field(0, exclude=True)
+    rating_3_count: int = Field(0, exclude=True)
+    rating_4_count: int = Field(0, exclude=True)
+    rating_5_count: int = Field(0, exclude=True)
+
+    @computed_field
+    @property
+    def rating_average(self) -> float | None:
+        if not self.rating_count:
+            return None
+        return round(self.rating_sum / self.rating_count, 2)
+
+    @computed_field
+    @property
+    def rating_histogram(self) -> dict[int, int]:
+        return {rating: getattr(self, f"rating_{rating}_count") for rating in RATINGS}
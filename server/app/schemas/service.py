@@ -1,9 +1,13 @@
 import uuid
+from datetime import datetime
 
 from fastapi import UploadFile
 from pydantic import BaseModel
 
-from app.schemas.user import User
+from app.models.service import MediaStatus, PricingType
+from app.schemas.pagination import Page
+from app.schemas.review import RatingSummary
+from app.schemas.user import Provider
 
 
 class ServiceBase(BaseModel):
@@ -21,8 +25,50 @@ class ServiceCreate(ServiceBase):
     pass
 
 
-class Service(ServiceBase):
+class ServiceTag(BaseModel):
     id: uuid.UUID
-    provider: User
+    text: str
+    service_id: uuid.UUID
 
     model_config = {"from_attributes": True}
+
+
+class ServiceMedia(BaseModel):
+    id: uuid.UUID
+    url: str
+    status: MediaStatus
+    variants: dict | None = None
+    service_id: uuid.UUID
+
+    model_config = {"from_attributes": True}
+
+
+class ServiceSummary(RatingSummary):
+    """
+    A service as shown in listings. Responses built from it need the `tags`
+    and `media` relationships loaded up front, see `crud.service.SERVICE_LOADERS`.
+    """
+
+    id: uuid.UUID
+    title: str
+    category: str
+    description: str
+    pricing: float
+    pricing_type: PricingType
+    location: str
+    provider_id: uuid.UUID
+    created_at: datetime
+    updated_at: datetime | None
+    tags: list[ServiceTag]
+    media: list[ServiceMedia]
+
+    model_config = {"from_attributes": True}
+
+
+class Service(ServiceSummary):
+    provider: Provider
+
+
+class ServiceSearchPage(Page[Service]):
+    # {"category": {value: count}, "pricing_type": {value: count}}
+    facets: dict[str, dict[str, int]]
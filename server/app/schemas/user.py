@@ -3,6 +3,7 @@ import uuid
 from pydantic import BaseModel, EmailStr
 
 from app.models.user import UserRole
+from app.schemas.review import RatingSummary
 
 
 class UserBase(BaseModel):
@@ -36,6 +37,21 @@ class User(UserBase):
     model_config = {"from_attributes": True}
 
 
+class CurrentUser(User):
+    """
+    Snapshot of the authenticated user, cached between requests. It is
+    detached from any session so it is immutable.
+    """
+
+    token_version: int
+
+    model_config = {"from_attributes": True, "frozen": True}
+
+
+class Provider(User, RatingSummary):
+    pass
+
+
 class UserSignUpResponse(BaseModel):
     user: User
     access_token: str
@@ -0,0 +1,75 @@
+import csv
+import enum
+import io
+import json
+from typing import Literal
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+ExportFormat = Literal["ndjson", "csv"]
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows fetched from the server side cursor (and written out) per chunk
+EXPORT_BATCH_SIZE = 1000
+
+
+def plain_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def iter_ndjson(columns: list[str], batches):
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(columns, map(plain_value, row))), default=str) + "\n"
+            for row in rows
+        )
+
+
+def iter_csv(columns: list[str], batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(map(plain_value, row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when there are no rows
+    yield buffer.getvalue()
+
+
+def export_response(
+    db: Session, statement: Select, export_format: ExportFormat, filename: str
+) -> StreamingResponse:
+    """
+    Streams the rows of a column select as NDJSON or CSV.
+
+    Rows are read from a server side cursor in batches of EXPORT_BATCH_SIZE and
+    written as they arrive, so memory use does not depend on the table size.
+    The session is closed once the export finishes.
+    """
+    columns = list(statement.selected_columns.keys())
+
+    def batches():
+        try:
+            result = db.execute(
+                statement.execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            yield from result.partitions()
+        finally:
+            db.close()
+
+    writer = iter_csv if export_format == "csv" else iter_ndjson
+    return StreamingResponse(
+        writer(columns, batches()),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format}"'
+        },
+    )
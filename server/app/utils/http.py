@@ -0,0 +1,209 @@
+import hashlib
+import mimetypes
+import os
+from email.utils import formatdate
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.datastructures import Headers
+
+from app.core.config import settings
+from app.utils.media import UploadTooLarge
+
+# Stored media never changes once written (originals are named after their
+# content hash and variants after the original), so clients may keep it forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """Build a strong ETag from the size and modification time of a file."""
+    key = f"{stat_result.st_size}-{stat_result.st_mtime_ns}".encode()
+    return '"' + hashlib.md5(key, usedforsecurity=False).hexdigest() + '"'
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag.removeprefix("W/") in tags
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single byte range into an inclusive (start, end) pair.
+
+    Returns None for headers that should be ignored (other units or multiple
+    ranges) and raises ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range, the last N bytes of the file
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start < 0 or start > end or start >= size:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path: str, start: int, end: int):
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def is_within(directory: str, path: str) -> bool:
+    directory = os.path.realpath(directory)
+    return os.path.commonpath([directory, path]) == directory
+
+
+def resolve_media_path(relative_path: str) -> str:
+    """
+    Resolve a path inside the media directory, refusing to escape it or to
+    serve the originals, which still carry their EXIF/GPS metadata. Earlier
+    versions stored them in the media directory's originals/.
+    """
+    root = os.path.realpath(settings.media_directory)
+    path = os.path.realpath(os.path.join(root, relative_path))
+    if (
+        not is_within(root, path)
+        or is_within(os.path.join(root, "originals"), path)
+        or is_within(settings.media_originals_directory, path)
+        or not os.path.isfile(path)
+    ):
+        raise HTTPException(status_code=404, detail="File not found")
+    return path
+
+
+def media_file_response(
+    request: Request,
+    relative_path: str,
+    media_type: str | None = None,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """
+    Serve a file from the media directory with long lived caching headers.
+
+    Conditional requests are answered with 304, single byte ranges with 206 and
+    when a X-Accel-Redirect prefix is configured the body is left to the proxy.
+    """
+    path = resolve_media_path(relative_path)
+    stat_result = os.stat(path)
+    etag = file_etag(stat_result)
+    media_type = media_type or mimetypes.guess_type(path)[0]
+    media_type = media_type or "application/octet-stream"
+
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if settings.media_accel_redirect_prefix:
+        # The proxy serves the body (and ranges) straight from disk
+        relative = os.path.relpath(path, os.path.realpath(settings.media_directory))
+        headers["X-Accel-Redirect"] = (
+            settings.media_accel_redirect_prefix.rstrip("/") + "/" + relative
+        )
+        return Response(media_type=media_type, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        size = stat_result.st_size
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{size}"},
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            if request.method == "HEAD":
+                return Response(status_code=206, media_type=media_type, headers=headers)
+            return StreamingResponse(
+                iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    return FileResponse(
+        path, media_type=media_type, headers=headers, stat_result=stat_result
+    )
+
+
+class MultipartSizeLimitMiddleware:
+    """
+    Rejects multipart bodies larger than `media_max_request_bytes` before
+    they're parsed, so oversized uploads aren't spooled to disk first. The
+    Content-Length is checked up front, and the body is counted as it
+    streams in, for clients that don't send one or lie about it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        headers = Headers(scope=scope) if scope["type"] == "http" else {}
+        if not headers.get("content-type", "").startswith("multipart/"):
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = settings.media_max_request_bytes
+        too_large = JSONResponse(
+            status_code=413, content={"detail": str(UploadTooLarge(max_bytes))}
+        )
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            await too_large(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+
+        async def receive_limited():
+            nonlocal received, exceeded
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                exceeded = True
+                raise UploadTooLarge(max_bytes)
+            return message
+
+        async def send_unless_exceeded(message):
+            # The body parser answers any error with a 400, the 413 replaces it
+            if not exceeded:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                await too_large(scope, receive, send)
+
+        await self.app(scope, receive_limited, send_unless_exceeded)
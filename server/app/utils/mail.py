@@ -5,6 +5,7 @@ from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 from pydantic import EmailStr
 
 from app.core.config import settings
+from app.core.outbox import outbox_handler
 
 conf = ConnectionConfig(
     MAIL_USERNAME=settings.mail_username,
@@ -30,6 +31,16 @@ async def send_email(subject: str, recipients: List[EmailStr], body: str):
     print("Sent message", message)
 
 
+@outbox_handler("email.verify_email")
+async def handle_verification_email(payload: dict):
+    await send_verification_email(**payload)
+
+
+@outbox_handler("email.reset_password")
+async def handle_reset_password_email(payload: dict):
+    await send_reset_password_email(**payload)
+
+
 async def send_verification_email(name: str, email: str, token: uuid.UUID):
     subject = "Verify your On-Demand Service Marketplace account"
     body = f"""
@@ -1,6 +1,103 @@
-from PIL import Image
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO
 
+from PIL import Image, ImageOps
 
-def compress_image(image_path: str, output_path: str, quality: int = 85):
+# Longest edge, in pixels, of each generated variant
+MEDIA_VARIANTS = {"thumb": 320, "card": 800, "full": 2048}
+
+# AVIF is only available when Pillow was built with (or extended by a
+# plugin for) it, WebP always is
+MEDIA_FORMATS = ["webp"]
+if ".avif" in Image.registered_extensions():
+    MEDIA_FORMATS.append("avif")
+
+DEFAULT_MEDIA_FORMAT = "webp"
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured maximum size."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Uploads are limited to {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+def store_upload(
+    file: BinaryIO, directory: str, max_bytes: int
+) -> tuple[str, str, bool]:
+    """
+    Streams an upload to `directory` in chunks while hashing it, and returns
+    its SHA-256 hex digest, its path and whether it was new. Files are stored
+    under their digest, so uploading the same content twice keeps a single
+    copy.
+
+    Raises `UploadTooLarge` as soon as more than `max_bytes` are read.
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as buffer:
+        try:
+            while chunk := file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(chunk)
+                buffer.write(chunk)
+        except BaseException:
+            buffer.close()
+            os.remove(buffer.name)
+            raise
+
+    path = os.path.join(directory, digest.hexdigest())
+    if os.path.exists(path):
+        os.remove(buffer.name)
+        return digest.hexdigest(), path, False
+
+    os.replace(buffer.name, path)
+    return digest.hexdigest(), path, True
+
+
+def variant_filename(name: str, variant: str, media_format: str) -> str:
+    return f"{name}_{variant}.{media_format}"
+
+
+def generate_variants(
+    image_path: str, output_directory: str, name: str, quality: int = 80
+) -> dict[str, dict[str, str]]:
+    """
+    Encodes every size variant of an image in every supported format and
+    returns the file names as {variant: {format: file name}}.
+
+    The image is rotated according to its EXIF orientation first. Metadata
+    (EXIF, ICC, XMP) is not carried over, and transparency is kept since
+    both WebP and AVIF support it.
+    """
+    variants = {}
     with Image.open(image_path) as img:
-        img.save(output_path, "JPEG", quality=quality)
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+
+        for variant, size in MEDIA_VARIANTS.items():
+            resized = img.copy()
+            # Only ever scales down, small originals are kept as is
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+            variants[variant] = {}
+            for media_format in MEDIA_FORMATS:
+                filename = variant_filename(name, variant, media_format)
+                resized.save(
+                    os.path.join(output_directory, filename),
+                    media_format.upper(),
+                    quality=quality,
+                )
+                variants[variant][media_format] = filename
+
+    return variants
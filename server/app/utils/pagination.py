@@ -0,0 +1,90 @@
+import base64
+import binascii
+import datetime
+import json
+import uuid
+
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values) -> str:
+    """Encode the sort key of the last row of a page into an opaque cursor."""
+    payload = json.dumps(
+        [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in values
+        ],
+        default=str,
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """Decode a cursor, converting each value with the matching type."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(payload)
+        if len(values) != len(types):
+            raise ValueError(cursor)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+
+    try:
+        return tuple(to_type(value) for to_type, value in zip(types, values))
+    except Exception as e:
+        # The values may be of any JSON type, uuid.UUID(123) for one raises
+        # AttributeError
+        raise InvalidCursor(cursor) from e
+
+
+def page_query(query, model, cursor: str | None, limit: int):
+    """
+    Restricts a Query or select() to the page after `cursor` in (created_at,
+    id) order, plus one row to know whether another page follows.
+    """
+    query = query.order_by(model.created_at.asc(), model.id.asc())
+    if cursor is not None:
+        created_at, id = decode_cursor(
+            cursor, datetime.datetime.fromisoformat, uuid.UUID
+        )
+        query = query.where(
+            or_(
+                model.created_at > created_at,
+                and_(model.created_at == created_at, model.id > id),
+            )
+        )
+    return query.limit(limit + 1)
+
+
+def paginate(query: Query, model, cursor: str | None, limit: int) -> dict:
+    """
+    Returns one page of `query` in (created_at, id) order, starting after
+    `cursor`, as {"items": [...], "next_cursor": str | None}.
+
+    Keyset pagination only reads the rows of the requested page, so the cost
+    does not grow with the offset like LIMIT/OFFSET does.
+    """
+    return page_result(page_query(query, model, cursor, limit).all(), limit)
+
+
+async def paginate_async(
+    db: AsyncSession, statement: Select, model, cursor: str | None, limit: int
+) -> dict:
+    """`paginate` for a select() of `model` on an AsyncSession."""
+    items = (await db.scalars(page_query(statement, model, cursor, limit))).all()
+    return page_result(items, limit)
+
+
+def page_result(items: list, limit: int) -> dict:
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+
+    return {"items": items, "next_cursor": next_cursor}
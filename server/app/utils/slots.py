@@ -0,0 +1,98 @@
+import datetime
+from typing import Iterable
+
+Interval = tuple[datetime.datetime, datetime.datetime]
+
+# datetime.weekday() order
+WEEKDAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+
+def expand_windows(
+    windows: dict[str, list[tuple[datetime.time, datetime.time]]],
+    start: datetime.date,
+    end: datetime.date,
+) -> list[Interval]:
+    """
+    Turns weekly {day: [(start_time, end_time)]} windows into concrete
+    intervals for every date in [start, end).
+    """
+    intervals = []
+    for offset in range((end - start).days):
+        date = start + datetime.timedelta(days=offset)
+        for start_time, end_time in windows.get(WEEKDAYS[date.weekday()], ()):
+            if end_time > start_time:
+                intervals.append(
+                    (
+                        datetime.datetime.combine(date, start_time),
+                        datetime.datetime.combine(date, end_time),
+                    )
+                )
+    return intervals
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> list[Interval]:
+    """Sorts intervals and merges the ones that overlap or touch."""
+    merged: list[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(
+    free: Iterable[Interval], busy: Iterable[Interval]
+) -> list[Interval]:
+    """
+    Removes the busy intervals from the free ones. Both sides are sorted and
+    merged first, then walked once, so the cost is O(n log n).
+    """
+    busy = merge_intervals(busy)
+    result = []
+    i = 0
+    for start, end in merge_intervals(free):
+        # Busy intervals ending before this one can't matter for later ones
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(busy) and busy[j][0] < end:
+            if busy[j][0] > start:
+                result.append((start, busy[j][0]))
+            start = max(start, busy[j][1])
+            j += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def split_into_slots(
+    free: Iterable[Interval], duration: datetime.timedelta
+) -> list[Interval]:
+    """Cuts free intervals into consecutive slots of `duration`."""
+    slots = []
+    for start, end in free:
+        while start + duration <= end:
+            slots.append((start, start + duration))
+            start += duration
+    return slots
+
+
+def bookable_slots(
+    windows: dict[str, list[tuple[datetime.time, datetime.time]]],
+    bookings: Iterable[Interval],
+    start: datetime.date,
+    end: datetime.date,
+    duration: datetime.timedelta,
+) -> list[Interval]:
+    """Free slots of `duration` between `start` and `end` (exclusive)."""
+    free = subtract_intervals(expand_windows(windows, start, end), bookings)
+    return split_into_slots(free, duration)
@@ -22,6 +22,37 @@ def user_payload(user_id):
     }
 
 
+@pytest.fixture()
+def provider_headers(test_client):
+    """Sign up a service provider and return its authorization headers."""
+    username = f"provider_{uuid.uuid4().hex[:8]}"
+    response = test_client.post(
+        "/api/v1/users/sign-up",
+        json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "name": username,
+            "password": "password",
+            "role": "provider",
+        },
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture()
+def admin_headers(test_client, db_session):
+    """Sign up a user, promote it to admin and return its authorization headers."""
+    from app.models.user import User, UserRole
+    from tests.api.endpoints.test_users import sign_up
+
+    username = f"admin_{uuid.uuid4().hex[:8]}"
+    access_token = sign_up(test_client, username)["access_token"]
+    admin = db_session.query(User).filter_by(username=username).one()
+    admin.role = UserRole.admin
+    db_session.flush()
+    return {"Authorization": f"Bearer {access_token}"}
+
+
 @pytest.fixture()
 def user_payload_updated(user_id):
     """Generate an updated user payload."""
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+import uuid
+
+from app.api.endpoints import admin
+from app.utils import export
+from tests.api.endpoints.test_users import sign_up
+
+
+def test_export_users_ndjson(test_client, admin_headers, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    usernames = [f"export_{uuid.uuid4().hex[:8]}" for _ in range(4)]
+    for username in usernames:
+        sign_up(test_client, username)
+
+    response = test_client.get("/api/v1/admin/users/export", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert set(usernames) <= {row["username"] for row in rows}
+    assert "hashed_password" not in rows[0]
+    assert {"admin", "customer"} <= {row["role"] for row in rows}
+
+
+def test_export_services_csv(test_client, admin_headers, provider_headers):
+    from tests.api.endpoints.test_services import service_form
+
+    test_client.post("/api/v1/services", data=service_form(), headers=provider_headers)
+
+    response = test_client.get(
+        "/api/v1/admin/services/export",
+        params={"format": "csv"},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "services.csv" in response.headers["content-disposition"]
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert "Plumbing" in [row["title"] for row in rows]
+    assert {row["pricing_type"] for row in rows} == {"hourly"}
+
+
+def test_export_requires_admin(test_client, provider_headers):
+    response = test_client.get("/api/v1/admin/users/export", headers=provider_headers)
+    assert response.status_code == 403
+
+
+def test_db_pool_metrics_endpoint(
+    test_client, admin_headers, timed_engine, monkeypatch
+):
+    monkeypatch.setattr(admin, "engine", timed_engine)
+    monkeypatch.setattr(admin, "async_engine", None)
+    with timed_engine.connect():
+        response = test_client.get(
+            "/api/v1/admin/metrics/db-pool", headers=admin_headers
+        )
+    assert response.status_code == 200
+    sync = response.json()["sync"]
+    assert sync["checked_out"] == 1
+    assert sync["idle"] == 0
+    assert sync["overflow"] == 0
+    assert sync["checkouts"] == 1
+    assert sync["avg_wait_ms"] >= 0
+    assert response.json()["async"] is None
+
+
+def test_db_pool_metrics_requires_admin(test_client, provider_headers):
+    response = test_client.get(
+        "/api/v1/admin/metrics/db-pool", headers=provider_headers
+    )
+    assert response.status_code == 403
@@ -0,0 +1,155 @@
+import datetime
+
+from tests.api.endpoints.test_services import service_form
+
+
+def availability(day, start_time="09:00:00", end_time="17:00:00", **overrides):
+    return {"day": day, "start_time": start_time, "end_time": end_time, **overrides}
+
+
+def list_availabilities(test_client, headers):
+    response = test_client.get("/api/v1/availability", headers=headers)
+    assert response.status_code == 200
+    return {row["day"]: row for row in response.json()["items"]}
+
+
+def test_save_recurring_availability_upserts(test_client, provider_headers):
+    response = test_client.post(
+        "/api/v1/availability",
+        json={"availabilities": [availability("monday"), availability("tuesday")]},
+        headers=provider_headers,
+    )
+    assert response.status_code == 204
+
+    response = test_client.post(
+        "/api/v1/availability",
+        json={
+            "availabilities": [
+                availability("monday", "08:00:00", is_available=False),
+                availability("friday"),
+                availability("friday", end_time="12:00:00"),
+            ]
+        },
+        headers=provider_headers,
+    )
+    assert response.status_code == 204
+
+    rows = list_availabilities(test_client, provider_headers)
+    assert sorted(rows) == ["friday", "monday", "tuesday"]
+    assert rows["monday"]["start_time"] == "08:00:00"
+    assert rows["monday"]["is_available"] is False
+    assert rows["friday"]["end_time"] == "12:00:00"
+
+
+def test_delete_all_availabilities(test_client, provider_headers):
+    test_client.post(
+        "/api/v1/availability",
+        json={"availabilities": [availability("monday"), availability("sunday")]},
+        headers=provider_headers,
+    )
+
+    response = test_client.delete("/api/v1/availability", headers=provider_headers)
+    assert response.status_code == 204
+    assert list_availabilities(test_client, provider_headers) == {}
+
+
+def test_service_slots(test_client, provider_headers, db_session):
+    test_client.post(
+        "/api/v1/availability",
+        json={"availabilities": [availability("monday", "09:00:00", "12:00:00")]},
+        headers=provider_headers,
+    )
+    service_id = test_client.post(
+        "/api/v1/services", data=service_form(), headers=provider_headers
+    ).json()["id"]
+
+    today = datetime.date.today()
+    monday = today + datetime.timedelta(days=7 - today.weekday())
+    response = test_client.post(
+        "/api/v1/bookings/",
+        json={
+            "service_id": service_id,
+            "booking_time": f"{monday}T10:00:00",
+            "duration_minutes": 60,
+        },
+        headers=provider_headers,
+    )
+    assert response.status_code == 200
+
+    params = {"start": monday.isoformat(), "end": monday + datetime.timedelta(days=7)}
+    response = test_client.get(f"/api/v1/services/{service_id}/slots", params=params)
+    assert response.status_code == 200
+    assert [slot["start"][11:16] for slot in response.json()] == ["09:00", "11:00"]
+
+    # Changing the availability invalidates the cached slots
+    test_client.post(
+        "/api/v1/availability",
+        json={"availabilities": [availability("monday", "11:00:00", "13:00:00")]},
+        headers=provider_headers,
+    )
+    response = test_client.get(f"/api/v1/services/{service_id}/slots", params=params)
+    assert [slot["start"][11:16] for slot in response.json()] == ["11:00", "12:00"]
+
+    response = test_client.get(
+        f"/api/v1/services/{service_id}/slots",
+        params={**params, "duration_minutes": 45},
+    )
+    assert [slot["start"][11:16] for slot in response.json()] == ["11:00", "11:45"]
+
+    response = test_client.get(
+        f"/api/v1/services/{service_id}/slots",
+        params={"start": monday.isoformat(), "end": monday.isoformat()},
+    )
+    assert response.status_code == 400
+
+
+def test_started_slots_are_not_served_from_the_cache(
+    test_client, provider_headers, monkeypatch
+):
+    from types import SimpleNamespace
+
+    from app.api.endpoints import services
+    from app.utils.slots import WEEKDAYS
+
+    today = datetime.date.today()
+    test_client.post(
+        "/api/v1/availability",
+        json={
+            "availabilities": [
+                availability(WEEKDAYS[today.weekday()], "09:00:00", "12:00:00")
+            ]
+        },
+        headers=provider_headers,
+    )
+    service_id = test_client.post(
+        "/api/v1/services", data=service_form(), headers=provider_headers
+    ).json()["id"]
+
+    def get_slots_at(hour, minute, second):
+        class Clock(datetime.datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.datetime.combine(
+                    today, datetime.time(hour, minute, second)
+                )
+
+        monkeypatch.setattr(
+            services,
+            "datetime",
+            SimpleNamespace(**{**vars(datetime), "datetime": Clock}),
+        )
+        return test_client.get(
+            f"/api/v1/services/{service_id}/slots",
+            params={"start": today, "end": today + datetime.timedelta(days=1)},
+        )
+
+    first = get_slots_at(10, 30, 0)
+    assert [slot["start"][11:16] for slot in first.json()] == ["11:00"]
+    assert [slot["start"][11:16] for slot in get_slots_at(10, 59, 59).json()] == [
+        "11:00"
+    ]
+
+    # Once 11:00 started, the cached slots aren't served anymore
+    response = get_slots_at(11, 0, 30)
+    assert response.json() == []
+    assert response.headers["ETag"] != first.headers["ETag"]
@@ -0,0 +1,60 @@
+from tests.api.endpoints.test_services import image_file, service_form
+
+
+def test_read_booking_query_count(test_client, provider_headers, count_queries):
+    service_id = test_client.post(
+        "/api/v1/services",
+        data={**service_form(), "tags": ["pipes"]},
+        files=[image_file()],
+        headers=provider_headers,
+    ).json()["id"]
+
+    response = test_client.post(
+        "/api/v1/bookings/",
+        json={"service_id": service_id, "booking_time": "2030-01-07T10:00:00"},
+        headers=provider_headers,
+    )
+    assert response.status_code == 200
+    booking = response.json()
+    assert booking["end_time"] == "2030-01-07T11:00:00"
+    assert booking["service"]["provider"]["id"] == booking["customer"]["id"]
+
+    with count_queries() as statements:
+        response = test_client.get(f"/api/v1/bookings/{booking['id']}")
+    assert response.status_code == 200
+    assert [tag["text"] for tag in response.json()["service"]["tags"]] == ["pipes"]
+    assert len(response.json()["service"]["media"]) == 1
+    # The booking with its customer, service and provider, then tags and media
+    assert len(statements) == 3
+
+
+def test_overlapping_booking_is_rejected(
+    test_client, provider_headers, db_session, monkeypatch, count_queries
+):
+    from sqlalchemy.exc import IntegrityError
+
+    service_id = test_client.post(
+        "/api/v1/services", data=service_form(), headers=provider_headers
+    ).json()["id"]
+    booking = {"service_id": service_id, "booking_time": "2030-01-07T10:00:00"}
+    response = test_client.post(
+        "/api/v1/bookings/", json=booking, headers=provider_headers
+    )
+    assert response.status_code == 200
+
+    # SQLite has no exclusion constraints, raise what PostgreSQL would
+    class ExclusionViolation(Exception):
+        pgcode = "23P01"
+
+    def flush():
+        raise IntegrityError("INSERT INTO bookings", {}, ExclusionViolation())
+
+    monkeypatch.setattr(db_session, "flush", flush)
+    with count_queries() as statements:
+        response = test_client.post(
+            "/api/v1/bookings/", json=booking, headers=provider_headers
+        )
+    assert response.status_code == 409
+    assert response.json() == {"detail": "This time slot is already booked"}
+    # Rejected before the provider's row was locked for the notification
+    assert not any(statement.startswith("UPDATE users") for statement in statements)
@@ -0,0 +1,80 @@
+import pytest
+
+from app.core.config import settings
+
+
+@pytest.fixture
+def media_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "media_directory", str(tmp_path))
+    (tmp_path / "photo.webp").write_bytes(bytes(range(256)))
+    return tmp_path
+
+
+def test_read_file_is_cacheable(test_client, media_directory):
+    response = test_client.get("/api/v1/files/photo.webp")
+    assert response.status_code == 200
+    assert response.content == bytes(range(256))
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["accept-ranges"] == "bytes"
+
+    response = test_client.get(
+        "/api/v1/files/photo.webp",
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_read_file_range(test_client, media_directory):
+    response = test_client.get(
+        "/api/v1/files/photo.webp", headers={"Range": "bytes=10-19"}
+    )
+    assert response.status_code == 206
+    assert response.content == bytes(range(10, 20))
+    assert response.headers["content-range"] == "bytes 10-19/256"
+
+    response = test_client.get(
+        "/api/v1/files/photo.webp", headers={"Range": "bytes=-6"}
+    )
+    assert response.status_code == 206
+    assert response.content == bytes(range(250, 256))
+
+    response = test_client.get(
+        "/api/v1/files/photo.webp", headers={"Range": "bytes=300-"}
+    )
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */256"
+
+
+def test_read_file_accel_redirect(test_client, media_directory, monkeypatch):
+    monkeypatch.setattr(settings, "media_accel_redirect_prefix", "/protected-files/")
+    response = test_client.get("/api/v1/files/photo.webp")
+    assert response.status_code == 200
+    assert response.headers["x-accel-redirect"] == "/protected-files/photo.webp"
+    assert response.content == b""
+
+
+def test_read_file_outside_media_directory(test_client, media_directory):
+    (media_directory.parent / "secret.txt").write_text("secret")
+    response = test_client.get(
+        f"/api/v1/files/..%2F{media_directory.parent.name}/secret.txt"
+    )
+    assert response.status_code == 404
+    response = test_client.get("/api/v1/files/missing.webp")
+    assert response.status_code == 404
+
+
+def test_originals_are_not_served(test_client, media_directory, monkeypatch):
+    # Where earlier versions stored them, and a configured directory that
+    # happens to be inside the media directory
+    (media_directory / "originals").mkdir()
+    (media_directory / "originals" / "abc").write_bytes(b"exif")
+    (media_directory / "uploads").mkdir()
+    (media_directory / "uploads" / "def").write_bytes(b"exif")
+    monkeypatch.setattr(
+        settings, "media_originals_directory", str(media_directory / "uploads")
+    )
+    for path in ["originals/abc", "uploads/def"]:
+        response = test_client.get(f"/api/v1/files/{path}")
+        assert response.status_code == 404
@@ -0,0 +1,406 @@
+import asyncio
+import datetime
+import uuid
+
+import fakeredis
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.socket import (
+    Backplane,
+    ConnectionManager,
+    MemoryBackplane,
+    PostgresBackplane,
+    RedisBackplane,
+)
+from app.crud.notification import add_notifications
+from app.models.notification import Notification
+from tests.api.endpoints.test_services import service_form
+from tests.api.endpoints.test_users import sign_up
+
+
+class FakeWebSocket:
+    def __init__(self, send_delay: float = 0, fail: bool = False):
+        self.messages = []
+        self.send_delay = send_delay
+        self.fail = fail
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(self.send_delay)
+        if self.fail:
+            raise ConnectionResetError()
+        self.messages.append(message)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+def auth_headers(access_token: str) -> dict:
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+def test_send_notification_over_websocket(test_client, admin_headers, dispatch_outbox):
+    username = f"alice_{uuid.uuid4().hex[:8]}"
+    access_token = sign_up(test_client, username)["access_token"]
+    headers = auth_headers(access_token)
+
+    with test_client.websocket_connect(
+        f"/api/v1/notifications/ws?token={access_token}"
+    ) as websocket:
+        response = test_client.post(
+            f"/api/v1/notifications/send-notification/{username}",
+            params={"message": "Booking confirmed"},
+            headers=admin_headers,
+        )
+        assert response.status_code == 200
+        # Pushed once the outbox is dispatched
+        dispatch_outbox()
+        pushed = websocket.receive_json()
+        assert pushed["description"] == "Booking confirmed"
+
+    # Stored as well, for clients that weren't connected
+    response = test_client.get("/api/v1/notifications", headers=headers)
+    assert response.json()["unread_count"] == 1
+    assert [item["id"] for item in response.json()["items"]] == [pushed["id"]]
+
+
+def test_broadcast_requires_an_admin(test_client, admin_headers):
+    customer = auth_headers(sign_up(test_client)["access_token"])
+    for headers, status_code in [({}, 401), (customer, 403), (admin_headers, 200)]:
+        response = test_client.post(
+            "/api/v1/notifications/broadcast",
+            params={"message": "Maintenance tonight"},
+            headers=headers,
+        )
+        assert response.status_code == status_code
+
+
+def test_websocket_requires_a_valid_token(test_client):
+    for url in ["/api/v1/notifications/ws", "/api/v1/notifications/ws?token=nope"]:
+        with pytest.raises(WebSocketDisconnect) as e:
+            with test_client.websocket_connect(url):
+                pass
+        assert e.value.code == 1008
+
+
+def test_websocket_metrics(test_client, admin_headers):
+    access_token = sign_up(test_client)["access_token"]
+    with test_client.websocket_connect(
+        "/api/v1/notifications/ws", headers=auth_headers(access_token)
+    ):
+        response = test_client.get(
+            "/api/v1/admin/metrics/websockets", headers=admin_headers
+        )
+        assert response.status_code == 200
+        assert response.json()["connections"] == 1
+        assert response.json()["users"] == 1
+
+
+def test_delta_returns_notifications_committed_late(test_client, db_session):
+    response_json = sign_up(test_client)
+    user_id = uuid.UUID(response_json["user"]["id"])
+    headers = auth_headers(response_json["access_token"])
+    add_notifications(db_session, [user_id], "First", "first")
+    db_session.commit()
+    feed = test_client.get("/api/v1/notifications", headers=headers).json()
+
+    # A transaction that started before the client synced commits afterwards,
+    # with an older created_at than the notification the cursor points at
+    add_notifications(db_session, [user_id], "Late", "late")
+    db_session.flush()
+    late = db_session.query(Notification).filter_by(title="Late").one()
+    late.created_at = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+    db_session.commit()
+
+    delta = test_client.get(
+        "/api/v1/notifications/delta",
+        params={"since": feed["cursor"]},
+        headers=headers,
+    ).json()
+    assert [item["title"] for item in delta["items"]] == ["Late"]
+    assert delta["unread_count"] == 2
+
+
+def test_notifications_delta_and_unread_count(test_client, provider_headers):
+    service_id = test_client.post(
+        "/api/v1/services", data=service_form(), headers=provider_headers
+    ).json()["id"]
+    customer = auth_headers(sign_up(test_client)["access_token"])
+
+    def book(day):
+        response = test_client.post(
+            "/api/v1/bookings/",
+            json={"service_id": service_id, "booking_time": f"2030-01-{day:02}T10:00"},
+            headers=customer,
+        )
+        assert response.status_code == 200
+
+    book(7)
+    feed = test_client.get("/api/v1/notifications", headers=provider_headers).json()
+    assert [item["title"] for item in feed["items"]] == ["New booking request"]
+    assert feed["unread_count"] == 1
+
+    # Nothing new since the last sync
+    delta = test_client.get(
+        "/api/v1/notifications/delta",
+        params={"since": feed["cursor"]},
+        headers=provider_headers,
+    ).json()
+    assert delta["items"] == []
+    assert delta["cursor"] == feed["cursor"]
+
+    book(8)
+    book(9)
+    delta = test_client.get(
+        "/api/v1/notifications/delta",
+        params={"since": feed["cursor"], "limit": 1},
+        headers=provider_headers,
+    ).json()
+    assert len(delta["items"]) == 1
+    assert delta["has_more"]
+    assert delta["unread_count"] == 3
+    delta = test_client.get(
+        "/api/v1/notifications/delta",
+        params={"since": delta["cursor"]},
+        headers=provider_headers,
+    ).json()
+    assert len(delta["items"]) == 1
+    assert not delta["has_more"]
+
+    # The customer is told when the booked service changes
+    test_client.put(
+        f"/api/v1/services/{service_id}",
+        data=service_form(pricing="30"),
+        headers=provider_headers,
+    )
+    feed = test_client.get("/api/v1/notifications", headers=customer).json()
+    assert [item["title"] for item in feed["items"]] == ["Service update"]
+
+    response = test_client.post(
+        "/api/v1/notifications/read",
+        json={"ids": [feed["items"][0]["id"]]},
+        headers=customer,
+    )
+    assert response.json() == {"unread_count": 0}
+    response = test_client.post(
+        "/api/v1/notifications/read", json={}, headers=provider_headers
+    )
+    assert response.json() == {"unread_count": 0}
+    # Already read notifications aren't counted twice
+    response = test_client.post(
+        "/api/v1/notifications/read", json={}, headers=provider_headers
+    )
+    assert response.json() == {"unread_count": 0}
+
+
+async def fan_out(backplane_factory):
+    """Two workers, with a user connected to each, sharing one backplane."""
+    workers = [ConnectionManager(backplane_factory()) for _ in range(2)]
+    for worker in workers:
+        await worker.start()
+
+    alice, bob = FakeWebSocket(), FakeWebSocket()
+    await workers[0].connect(alice, "alice")
+    await workers[1].connect(bob, "bob")
+
+    # Published on the worker alice isn't connected to
+    await workers[1].send_personal_message("for alice", "alice")
+    await workers[0].broadcast("for everyone")
+    for _ in range(100):
+        if len(alice.messages) == 2 and len(bob.messages) == 1:
+            break
+        await asyncio.sleep(0.01)
+
+    for worker in workers:
+        await worker.stop()
+    return alice.messages, bob.messages
+
+
+def test_messages_reach_other_workers():
+    backplane = MemoryBackplane()
+    alice, bob = asyncio.run(fan_out(lambda: backplane))
+    assert alice == ["for alice", "for everyone"]
+    assert bob == ["for everyone"]
+
+
+def test_redis_backplane():
+    server = fakeredis.FakeServer()
+
+    def backplane():
+        client = fakeredis.aioredis.FakeRedis(server=server)
+        return RedisBackplane("redis://", "notifications", client=client)
+
+    alice, bob = asyncio.run(fan_out(backplane))
+    assert alice == ["for alice", "for everyone"]
+    assert bob == ["for everyone"]
+
+
+def test_redis_backplane_starts_while_redis_is_down():
+    server = fakeredis.FakeServer()
+    server.connected = False
+
+    async def run():
+        backplane = RedisBackplane(
+            "redis://",
+            "notifications",
+            client=fakeredis.aioredis.FakeRedis(server=server),
+            retry_delay=0.01,
+            start_timeout=0.1,
+        )
+        received = []
+
+        async def handler(message):
+            received.append(message)
+
+        await asyncio.wait_for(backplane.start(handler), 1)
+
+        # Subscribes in the background once Redis is back
+        server.connected = True
+        publisher = fakeredis.aioredis.FakeRedis(server=server)
+        for _ in range(100):
+            await publisher.publish("notifications", '{"message": "hello"}')
+            if received:
+                break
+            await asyncio.sleep(0.01)
+        await backplane.stop()
+        return received
+
+    assert asyncio.run(run())[0] == {"message": "hello"}
+
+
+def test_postgres_backplane(postgres_url):
+    from sqlalchemy import make_url
+
+    dsn = make_url(postgres_url).set(drivername="postgresql")
+    dsn = dsn.render_as_string(hide_password=False)
+    alice, bob = asyncio.run(
+        fan_out(lambda: PostgresBackplane(dsn, f"test_{uuid.uuid4().hex[:8]}"))
+    )
+    assert alice == ["for alice", "for everyone"]
+    assert bob == ["for everyone"]
+
+
+def test_backplane_errors_do_not_fail_the_sender():
+    class BrokenBackplane(Backplane):
+        async def start(self, handler):
+            pass
+
+        async def publish(self, message):
+            raise ConnectionError("backplane unavailable")
+
+    async def send():
+        manager = ConnectionManager(BrokenBackplane())
+        await manager.start()
+        await manager.send_personal_message("for alice", "alice")
+        await manager.broadcast("for everyone")
+        await manager.stop()
+
+    asyncio.run(send())
+
+
+def test_slow_and_dead_connections_do_not_stall_delivery():
+    async def deliver():
+        manager = ConnectionManager(queue_size=5, send_timeout=0.5)
+        await manager.start()
+        fast, slow, dead = FakeWebSocket(), FakeWebSocket(10), FakeWebSocket(fail=True)
+        for username, websocket in [("fast", fast), ("slow", slow), ("dead", dead)]:
+            await manager.connect(websocket, username)
+
+        for i in range(10):
+            await manager.broadcast({"n": i})
+            await asyncio.sleep(0.01)
+
+        remaining = set(manager.active_connections)
+        await manager.stop()
+        return fast, slow, dead, remaining
+
+    fast, slow, dead, remaining = asyncio.run(deliver())
+    # Serialized once, delivered in order to the client keeping up
+    assert fast.messages == [f'{{"n": {i}}}' for i in range(10)]
+    # The slow client overflowed its queue and was closed, the dead one dropped
+    assert slow.messages == []
+    assert slow.close_code == 1013
+    assert dead.close_code == 1011
+    assert remaining == {"fast"}
+
+
+def test_idle_connections_are_reaped():
+    async def run():
+        manager = ConnectionManager(heartbeat_interval=0.02, idle_timeout=0.1)
+        await manager.start()
+        active, idle = FakeWebSocket(), FakeWebSocket()
+        connection = await manager.connect(active, "active")
+        await manager.connect(idle, "idle")
+
+        for _ in range(15):
+            await asyncio.sleep(0.02)
+            # The client answering the pings
+            connection.touch()
+
+        stats = manager.stats()
+        await manager.stop()
+        return active, idle, stats
+
+    active, idle, stats = asyncio.run(run())
+    assert '{"type": "ping"}' in active.messages
+    assert active.close_code == 1000
+    assert idle.close_code == 1001
+    assert stats["connections"] == 1
+    assert stats["reaped_idle"] == 1
+
+
+def test_connection_caps():
+    async def run():
+        manager = ConnectionManager(max_connections_per_user=2, max_connections=3)
+        websockets = [FakeWebSocket() for _ in range(5)]
+        accepted = [
+            await manager.connect(websocket, "alice") for websocket in websockets[:3]
+        ]
+        accepted.append(await manager.connect(websockets[3], "bob"))
+        # Full, refused
+        accepted.append(await manager.connect(websockets[4], "carol"))
+        await asyncio.sleep(0)
+        return websockets, accepted, manager.stats()
+
+    websockets, accepted, stats = asyncio.run(run())
+    # alice's oldest connection made room for her third one
+    assert websockets[0].close_code == 1008
+    assert accepted[4] is None
+    assert websockets[4].close_code == 1013
+    assert stats["connections"] == 3
+    assert stats["users"] == 2
+    assert stats["replaced"] == 1
+    assert stats["rejected"] == 1
+
+
+def test_dropped_connections_are_closed_and_uncounted():
+    async def run():
+        manager = ConnectionManager(
+            heartbeat_interval=0.02, max_connections_per_user=1, max_connections=1
+        )
+        await manager.start()
+        dead = FakeWebSocket(fail=True)
+        await manager.connect(dead, "alice")
+        # The first ping fails to send
+        await asyncio.sleep(0.05)
+        stats = manager.stats()
+
+        # Its slot is free again, nothing needs replacing or refusing
+        replacement = FakeWebSocket()
+        accepted = await manager.connect(replacement, "alice")
+        after = manager.stats()
+        await manager.stop()
+        return dead, accepted, stats, after
+
+    dead, accepted, stats, after = asyncio.run(run())
+    assert dead.close_code == 1011
+    assert stats["connections"] == 0
+    assert stats["dropped"] == 1
+    assert accepted is not None
+    assert after["connections"] == 1
+    assert after["replaced"] == 0
+    assert after["rejected"] == 0
@@ -0,0 +1,69 @@
+from tests.api.endpoints.test_services import service_form
+from tests.api.endpoints.test_users import sign_up
+
+
+def book(test_client, service_id, headers, booking_time):
+    response = test_client.post(
+        "/api/v1/bookings/",
+        json={"service_id": service_id, "booking_time": booking_time},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_reviews_update_rating_aggregates(test_client, provider_headers):
+    service_id = test_client.post(
+        "/api/v1/services", data=service_form(), headers=provider_headers
+    ).json()["id"]
+    customer_headers = {
+        "Authorization": f"Bearer {sign_up(test_client)['access_token']}"
+    }
+
+    for hour, rating in [(9, 4), (11, 2), (13, 5)]:
+        booking_id = book(
+            test_client, service_id, customer_headers, f"2030-01-07T{hour:02}:00:00"
+        )
+        response = test_client.post(
+            "/api/v1/reviews/",
+            json={"booking_id": booking_id, "rating": rating, "comment": "ok"},
+            headers=customer_headers,
+        )
+        assert response.status_code == 200
+        assert response.json()["service_id"] == service_id
+
+    service = test_client.get(f"/api/v1/services/{service_id}").json()
+    assert service["rating_count"] == 3
+    assert service["rating_average"] == 3.67
+    assert service["rating_histogram"] == {"1": 0, "2": 1, "3": 0, "4": 1, "5": 1}
+    assert "rating_sum" not in service
+    assert service["provider"]["rating_count"] == 3
+
+    response = test_client.get(f"/api/v1/reviews/{service_id}")
+    assert sorted(review["rating"] for review in response.json()["items"]) == [2, 4, 5]
+
+
+def test_review_requires_own_booking(test_client, provider_headers):
+    service_id = test_client.post(
+        "/api/v1/services", data=service_form(), headers=provider_headers
+    ).json()["id"]
+    booking_id = book(test_client, service_id, provider_headers, "2030-01-07T09:00:00")
+    other_headers = {"Authorization": f"Bearer {sign_up(test_client)['access_token']}"}
+
+    response = test_client.post(
+        "/api/v1/reviews/",
+        json={"booking_id": booking_id, "rating": 5, "comment": "great"},
+        headers=other_headers,
+    )
+    assert response.status_code == 403
+
+    response = test_client.post(
+        "/api/v1/reviews/",
+        json={"booking_id": booking_id, "rating": 6, "comment": "great"},
+        headers=provider_headers,
+    )
+    assert response.status_code == 422
+
+    service = test_client.get(f"/api/v1/services/{service_id}").json()
+    assert service["rating_count"] == 0
+    assert service["rating_average"] is None
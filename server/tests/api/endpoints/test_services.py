@@ -0,0 +1,622 @@
+import io
+import uuid
+
+from PIL import Image
+from sqlalchemy.dialects import postgresql
+
+from app.crud.service import search_statement, suggest_services, suggest_statement
+from app.models.service import Service as ServiceModel
+from app.utils.pagination import encode_cursor
+
+
+def service_form(**overrides):
+    form = {
+        "name": "Plumbing",
+        "category": "home",
+        "description": "Fixing leaks",
+        "pricing_type": "hourly",
+        "pricing": "25",
+        "location": "Springfield",
+    }
+    form.update(overrides)
+    return form
+
+
+def image_file(name="photo.png", size=(64, 64), mode="RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (255, 0, 0, 128)).save(buffer, "PNG")
+    return ("media", (name, buffer.getvalue(), "image/png"))
+
+
+def test_create_service_with_tags_and_media(test_client, provider_headers):
+    response = test_client.post(
+        "/api/v1/services",
+        data={**service_form(), "tags": ["pipes", "leaks", "pipes", " "]},
+        files=[image_file(), image_file("other.png")],
+        headers=provider_headers,
+    )
+    assert response.status_code == 201
+
+    response = test_client.get(f"/api/v1/services/{response.json()['id']}")
+    response_json = response.json()
+    assert response.status_code == 200
+    assert sorted(tag["text"] for tag in response_json["tags"]) == ["leaks", "pipes"]
+    assert len(response_json["media"]) == 2
+    assert all(media["status"] == "ready" for media in response_json["media"])
+
+
+def test_update_service_diffs_tags(test_client, provider_headers, db_session):
+    response = test_client.post(
+        "/api/v1/services",
+        data={**service_form(), "tags": ["pipes", "leaks"]},
+        headers=provider_headers,
+    )
+    service_id = response.json()["id"]
+    tags = test_client.get(f"/api/v1/services/{service_id}").json()["tags"]
+    pipes_id = next(tag["id"] for tag in tags if tag["text"] == "pipes")
+
+    response = test_client.put(
+        f"/api/v1/services/{service_id}",
+        data={**service_form(name="Plumbing & heating"), "tags": ["pipes", "heating"]},
+        headers=provider_headers,
+    )
+    assert response.status_code == 200
+
+    response_json = test_client.get(f"/api/v1/services/{service_id}").json()
+    assert response_json["title"] == "Plumbing & heating"
+    assert sorted(tag["text"] for tag in response_json["tags"]) == ["heating", "pipes"]
+    # Tags kept across the update are not deleted and re-inserted
+    assert pipes_id in [tag["id"] for tag in response_json["tags"]]
+    # and the searched tag text follows them
+    assert db_session.get(ServiceModel, uuid.UUID(service_id)).tags_text == (
+        "pipes heating"
+    )
+
+
+def test_media_variants(test_client, provider_headers):
+    response = test_client.post(
+        "/api/v1/services",
+        data=service_form(),
+        files=[image_file(size=(1600, 800), mode="RGBA")],
+        headers=provider_headers,
+    )
+    service = test_client.get(f"/api/v1/services/{response.json()['id']}").json()
+    media = service["media"][0]
+    assert set(media["variants"]) == {"thumb", "card", "full"}
+    assert media["url"] == media["variants"]["full"]["webp"]
+
+    response = test_client.get(f"/api/v1/services/media/{media['id']}/thumb")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    with Image.open(io.BytesIO(response.content)) as thumb:
+        assert thumb.size == (320, 160)
+        assert thumb.mode == "RGBA"
+
+    response = test_client.get(f"/api/v1/services/media/{media['id']}/huge")
+    assert response.status_code == 404
+
+
+def test_identical_media_is_stored_and_processed_once(
+    test_client, provider_headers, monkeypatch
+):
+    from app.core.media_pipeline import media_pipeline
+
+    submitted = []
+    submit = media_pipeline.submit
+    monkeypatch.setattr(
+        media_pipeline, "submit", lambda jobs: submitted.extend(jobs) or submit(jobs)
+    )
+
+    media = []
+    for _ in range(2):
+        response = test_client.post(
+            "/api/v1/services",
+            data=service_form(),
+            files=[image_file(size=(10, 10))],
+            headers=provider_headers,
+        )
+        service_id = response.json()["id"]
+        media += test_client.get(f"/api/v1/services/{service_id}").json()["media"]
+
+    assert len(submitted) == 1
+    assert media[0]["url"] == media[1]["url"]
+    assert media[0]["variants"] == media[1]["variants"]
+    assert media[1]["status"] == "ready"
+
+
+def test_uploaded_original_is_not_served(test_client, provider_headers):
+    import hashlib
+    import os
+
+    from app.core.config import settings
+    from app.crud.service import ORIGINALS_DIRECTORY
+
+    upload = image_file()
+    response = test_client.post(
+        "/api/v1/services",
+        data=service_form(),
+        files=[upload],
+        headers=provider_headers,
+    )
+    assert response.status_code == 201
+    assert "content_hash" not in response.json()["media"][0]
+
+    content_hash = hashlib.sha256(upload[1][1]).hexdigest()
+    path = os.path.join(ORIGINALS_DIRECTORY, content_hash)
+    assert os.path.isfile(path)
+    relative = os.path.relpath(path, settings.media_directory)
+    for url in [f"originals/{content_hash}", relative]:
+        response = test_client.get(f"/api/v1/files/{url}")
+        assert response.status_code == 404
+
+
+def test_media_left_processing_is_resumed(
+    test_client, provider_headers, db_session, monkeypatch
+):
+    from app.core.media_pipeline import media_pipeline
+    from app.models.service import ServiceMedia
+
+    # The worker stops before the jobs run
+    with monkeypatch.context() as patch:
+        patch.setattr(media_pipeline, "submit", lambda jobs: None)
+        service_id = test_client.post(
+            "/api/v1/services",
+            data=service_form(),
+            files=[image_file()],
+            headers=provider_headers,
+        ).json()["id"]
+    # And one whose original is gone
+    db_session.add(
+        ServiceMedia(
+            url="missing.webp",
+            content_hash="0" * 64,
+            service_id=uuid.UUID(service_id),
+        )
+    )
+    db_session.commit()
+
+    media_pipeline.resume()
+
+    media = test_client.get(f"/api/v1/services/{service_id}").json()["media"]
+    statuses = {item["url"]: item["status"] for item in media}
+    assert statuses.pop("missing.webp") == "failed"
+    assert list(statuses.values()) == ["ready"]
+
+
+def test_media_variant_of_unfinished_media(test_client, provider_headers, db_session):
+    from app.models.service import MediaStatus, ServiceMedia
+
+    service_id = test_client.post(
+        "/api/v1/services", data=service_form(), headers=provider_headers
+    ).json()["id"]
+    media = {
+        status: ServiceMedia(
+            url=f"{status.value}.webp",
+            status=status,
+            service_id=uuid.UUID(service_id),
+        )
+        for status in [MediaStatus.processing, MediaStatus.failed]
+    }
+    db_session.add_all(media.values())
+    db_session.commit()
+    processing, failed = media[MediaStatus.processing].id, media[MediaStatus.failed].id
+
+    response = test_client.get(f"/api/v1/services/media/{processing}/thumb")
+    assert response.status_code == 409
+    response = test_client.get(f"/api/v1/services/media/{failed}/thumb")
+    assert response.status_code == 410
+    assert response.json() == {"detail": "Media processing failed"}
+
+
+def test_upload_size_limit(test_client, provider_headers, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "media_max_upload_bytes", 100)
+
+    response = test_client.post(
+        "/api/v1/services",
+        data=service_form(),
+        files=[image_file(size=(200, 200))],
+        headers=provider_headers,
+    )
+    assert response.status_code == 413
+
+
+def test_oversized_upload_leaves_no_files(test_client, provider_headers, monkeypatch):
+    import hashlib
+    import os
+
+    from app.core.config import settings
+    from app.crud.service import ORIGINALS_DIRECTORY
+
+    monkeypatch.setattr(settings, "media_max_upload_bytes", 100)
+    # New content, stored before the next file trips the limit
+    content = os.urandom(50)
+
+    response = test_client.post(
+        "/api/v1/services",
+        data=service_form(),
+        files=[
+            ("media", ("small.bin", content, "application/octet-stream")),
+            image_file(size=(200, 200)),
+        ],
+        headers=provider_headers,
+    )
+    assert response.status_code == 413
+    path = os.path.join(ORIGINALS_DIRECTORY, hashlib.sha256(content).hexdigest())
+    assert not os.path.exists(path)
+
+
+def test_oversized_request_is_rejected_before_parsing(
+    test_client, provider_headers, monkeypatch
+):
+    from app.core.config import settings
+    from app.crud import service
+
+    def store_upload(*args):
+        raise AssertionError("the upload should not reach the endpoint")
+
+    monkeypatch.setattr(settings, "media_max_request_bytes", 1000)
+    monkeypatch.setattr(service, "store_upload", store_upload)
+
+    boundary = "limit"
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="media"; filename="big.bin"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+        f"{'x' * 2000}\r\n"
+        f"--{boundary}--\r\n"
+    ).encode()
+    headers = {
+        **provider_headers,
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+    }
+
+    # Declared too large up front
+    response = test_client.post("/api/v1/services", content=body, headers=headers)
+    assert response.status_code == 413
+
+    # Streamed without a Content-Length, cut off once past the limit
+    chunks = (body[i : i + 100] for i in range(0, len(body), 100))
+    response = test_client.post("/api/v1/services", content=chunks, headers=headers)
+    assert response.status_code == 413
+
+
+def test_list_services_pages(test_client, provider_headers):
+    created = [
+        test_client.post(
+            "/api/v1/services",
+            data=service_form(name=f"Service {i}"),
+            headers=provider_headers,
+        ).json()["id"]
+        for i in range(5)
+    ]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = test_client.get(
+            "/api/v1/services", params=params, headers=provider_headers
+        )
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= 2
+        seen += [service["id"] for service in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert sorted(seen) == sorted(created)
+    assert len(seen) == len(set(seen))
+
+
+def test_list_services_invalid_cursor(test_client, provider_headers):
+    response = test_client.get(
+        "/api/v1/services", params={"cursor": "not-a-cursor"}, headers=provider_headers
+    )
+    assert response.status_code == 400
+
+    # Well formed cursors holding values of the wrong type
+    for url, cursor in [
+        ("/api/v1/services", encode_cursor("2030-01-01T00:00:00", 123)),
+        ("/api/v1/services/search", encode_cursor(1.0, 123)),
+        ("/api/v1/services/search", encode_cursor([], {})),
+    ]:
+        response = test_client.get(
+            url, params={"cursor": cursor}, headers=provider_headers
+        )
+        assert response.status_code == 400
+
+    response = test_client.get(
+        "/api/v1/services", params={"limit": 1000}, headers=provider_headers
+    )
+    assert response.status_code == 422
+
+
+def test_list_services_query_count(test_client, provider_headers, count_queries):
+    def create_service():
+        test_client.post(
+            "/api/v1/services",
+            data={**service_form(), "tags": ["pipes", "leaks"]},
+            files=[image_file()],
+            headers=provider_headers,
+        )
+
+    def list_services():
+        with count_queries() as statements:
+            response = test_client.get("/api/v1/services", headers=provider_headers)
+        assert response.status_code == 200
+        return response.json()["items"], len(statements)
+
+    create_service()
+    services, queries = list_services()
+    assert len(services) == 1
+
+    for _ in range(3):
+        create_service()
+    services, more_queries = list_services()
+    assert len(services) == 4
+    assert all(len(service["tags"]) == 2 for service in services)
+    assert all(len(service["media"]) == 1 for service in services)
+    # One query for the page, one per collection
+    assert queries == more_queries == 3
+
+
+def test_read_service_is_cached(test_client, provider_headers, count_queries):
+    response = test_client.post(
+        "/api/v1/services", data=service_form(), headers=provider_headers
+    )
+    service_id = response.json()["id"]
+
+    response = test_client.get(f"/api/v1/services/{service_id}")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    etag = response.headers["etag"]
+
+    with count_queries() as statements:
+        cached = test_client.get(f"/api/v1/services/{service_id}")
+        not_modified = test_client.get(
+            f"/api/v1/services/{service_id}", headers={"If-None-Match": etag}
+        )
+    assert statements == []
+    assert cached.json() == response.json()
+    assert cached.headers["etag"] == etag
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    test_client.put(
+        f"/api/v1/services/{service_id}",
+        data=service_form(name="Plumbing & heating"),
+        headers=provider_headers,
+    )
+    response = test_client.get(
+        f"/api/v1/services/{service_id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["title"] == "Plumbing & heating"
+    assert response.headers["etag"] != etag
+
+    test_client.delete(f"/api/v1/services/{service_id}", headers=provider_headers)
+    response = test_client.get(f"/api/v1/services/{service_id}")
+    assert response.status_code == 404
+
+
+def test_read_service_redis_cache(test_client, provider_headers, monkeypatch):
+    import fakeredis
+
+    from app.core.cache import RedisCacheBackend, response_cache
+
+    redis = fakeredis.FakeRedis()
+    monkeypatch.setattr(
+        response_cache, "backend", RedisCacheBackend("redis://", client=redis)
+    )
+    response = test_client.post(
+        "/api/v1/services", data=service_form(), headers=provider_headers
+    )
+    service_id = response.json()["id"]
+
+    etag = test_client.get(f"/api/v1/services/{service_id}").headers["etag"]
+    assert any(key.startswith(b"cache:service:") for key in redis.keys())
+    response = test_client.get(
+        f"/api/v1/services/{service_id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    test_client.put(
+        f"/api/v1/services/{service_id}",
+        data=service_form(pricing="30"),
+        headers=provider_headers,
+    )
+    response = test_client.get(f"/api/v1/services/{service_id}")
+    assert response.json()["pricing"] == 30
+
+
+def test_search_statement_matches_the_indexed_vector():
+    cursor = encode_cursor(0.5, uuid.uuid4())
+    statement = search_statement(
+        "leaky pipes", category="home", min_price=10, cursor=cursor, limit=20
+    )
+    sql = " ".join(
+        str(
+            statement.compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        ).split()
+    )
+
+    # Matched and ranked on the GIN indexed column alone, tags included
+    assert "WHERE services.pricing >= 10" in sql
+    assert "services.search_vector @@ parse_websearch(" in sql
+    assert "ts_rank(services.search_vector, parse_websearch(" in sql
+    assert "string_agg" not in sql
+    assert "to_tsvector" not in sql
+    # Keyset pagination on (rank, id), one row more than the page
+    assert "matches.rank < CAST(0.5 AS REAL) OR matches.rank = CAST(0.5 AS REAL)" in sql
+    assert "ORDER BY matches.rank DESC, matches.id LIMIT 21" in sql
+    assert "matches.category = 'home'" in sql
+
+
+def test_autocomplete_validation(test_client):
+    for params in [
+        {},
+        {"q": "x" * 101},
+        {"q": "plumb", "limit": 0},
+        {"q": "plumb", "limit": 26},
+    ]:
+        response = test_client.get("/api/v1/services/autocomplete", params=params)
+        assert response.status_code == 422
+
+    # Nothing typed yet, nothing to suggest
+    response = test_client.get("/api/v1/services/autocomplete", params={"q": "  "})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_autocomplete_statement_uses_the_trigram_operators():
+    sql = " ".join(
+        str(
+            suggest_statement("plumb", 5).compile(
+                # Without pyformat, which escapes % as %%
+                dialect=postgresql.dialect(paramstyle="named"),
+                compile_kwargs={"literal_binds": True},
+            )
+        ).split()
+    )
+
+    # Every source is filtered with <%, served by its trigram index
+    for column in ["title", "category", "location"]:
+        assert f"'plumb' <% services.{column}" in sql
+        assert f"word_similarity('plumb', services.{column})" in sql
+    assert "'plumb' <% services_tags.text" in sql
+    assert "ORDER BY max(anon_1.score) DESC, length(anon_1.text), anon_1.text" in sql
+    assert sql.endswith("LIMIT 5")
+
+
+def test_autocomplete_on_postgres(postgres_url):
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+
+    from app.db.session import Base
+    from app.models.service import Service, ServiceTag
+    from app.models.user import User
+
+    engine = create_engine(postgres_url)
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        Base.metadata.create_all(
+            connection, tables=[User.__table__, Service.__table__, ServiceTag.__table__]
+        )
+        db = Session(bind=connection)
+        provider = User(username="autocomplete", email="autocomplete@example.com")
+        db.add(provider)
+        db.flush()
+        service = Service(
+            title="Plumbing",
+            category="home",
+            location="Springfield",
+            pricing=25,
+            provider_id=provider.id,
+        )
+        db.add(service)
+        db.flush()
+        db.add(ServiceTag(text="plumber", service_id=service.id))
+        db.flush()
+
+        suggestions = suggest_services(db, "plumb", 5)
+        transaction.rollback()
+    engine.dispose()
+
+    assert suggestions[0] == {"text": "Plumbing", "kind": "title"}
+    assert {"text": "plumber", "kind": "tag"} in suggestions
+    assert all(suggestion["kind"] != "location" for suggestion in suggestions)
+
+
+def test_search_on_postgres(postgres_url):
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+    from sqlalchemy_searchable import sql_expressions, sync_trigger
+
+    from app.crud.service import find_services
+    from app.db.session import Base
+    from app.models.service import PricingType, ServiceTag
+    from app.models.user import User
+
+    engine = create_engine(postgres_url)
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(sql_expressions)
+        Base.metadata.create_all(
+            connection,
+            tables=[User.__table__, ServiceModel.__table__, ServiceTag.__table__],
+        )
+        sync_trigger(
+            connection,
+            "services",
+            "search_vector",
+            ["title", "description", "category", "location", "tags_text"],
+        )
+        db = Session(bind=connection)
+        provider = User(username="search", email="search@example.com")
+        db.add(provider)
+        db.flush()
+
+        def add(title, description, category, pricing_type, pricing, tags=""):
+            service = ServiceModel(
+                title=title,
+                description=description,
+                category=category,
+                location="Springfield",
+                pricing=pricing,
+                pricing_type=pricing_type,
+                provider_id=provider.id,
+                tags_text=tags,
+            )
+            db.add(service)
+            db.flush()
+            return service.id
+
+        repair = add("Repairs", "Plumbing", "home", PricingType.fixed, 50, "pipes")
+        # Created before services had a category
+        emergency = add(
+            "Plumbing",
+            "Plumbing emergencies, plumbing done fast",
+            None,
+            PricingType.hourly,
+            80,
+        )
+        add("Gardening", "Lawns", "garden", PricingType.hourly, 30)
+
+        def search(term, **kwargs):
+            page = find_services(db, term, **kwargs)
+            return [service.id for service in page["items"]], page
+
+        # Best matches first, the NULL category isn't a facet
+        ids, page = search("plumbing")
+        assert ids == [emergency, repair]
+        assert page["facets"] == {
+            "category": {"home": 1},
+            "pricing_type": {"fixed": 1, "hourly": 1},
+        }
+        # Tags are matched too
+        assert search("pipes")[0] == [repair]
+        # Each facet ignores its own filter
+        ids, page = search("plumbing", pricing_type=PricingType.hourly)
+        assert ids == [emergency]
+        assert page["facets"] == {
+            "category": {},
+            "pricing_type": {"fixed": 1, "hourly": 1},
+        }
+        assert search("plumbing", category="home")[0] == [repair]
+        assert search("plumbing", min_price=60)[0] == [emergency]
+        assert search("plumbing", max_price=60)[0] == [repair]
+
+        # The rank cursor continues where the previous page stopped
+        first, page = search("plumbing", limit=1)
+        second, last_page = search("plumbing", limit=1, cursor=page["next_cursor"])
+        assert first + second == [emergency, repair]
+        assert last_page["next_cursor"] is None
+
+        transaction.rollback()
+    engine.dispose()
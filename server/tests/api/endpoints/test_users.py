@@ -1,3 +1,8 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Event
+
 from app.schemas.user import UserCreate
 
 
@@ -28,3 +33,233 @@ def test_user_register_as_customer(test_client):
     assert response_json["name"] == "johndoe"
     assert response_json["role"] == "customer"
     assert response_json["is_active"] is True
+
+
+def sign_up(test_client, username=None, role="customer"):
+    username = username or f"user_{uuid.uuid4().hex[:8]}"
+    response = test_client.post(
+        "/api/v1/users/sign-up",
+        json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "name": username,
+            "password": "password",
+            "role": role,
+        },
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_current_user_from_token(test_client):
+    access_token = sign_up(test_client, "janedoe")["access_token"]
+
+    response = test_client.get(
+        "/api/v1/users/current-user",
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    response_json = response.json()
+    assert response.status_code == 200
+    assert response_json["username"] == "janedoe"
+    assert "hashed_password" not in response_json
+
+
+def test_current_user_is_cached(test_client, db_session):
+    from app.core.security import principal_cache
+
+    response_json = sign_up(test_client)
+    headers = {"Authorization": f"Bearer {response_json['access_token']}"}
+
+    response = test_client.get("/api/v1/users/current-user", headers=headers)
+    assert response.status_code == 200
+    assert principal_cache.get(uuid.UUID(response_json["user"]["id"])) is not None
+
+
+def test_token_revoked_by_version_bump(test_client, db_session):
+    from app.core.security import invalidate_principal
+    from app.models.user import User as UserModel
+
+    response_json = sign_up(test_client)
+    headers = {"Authorization": f"Bearer {response_json['access_token']}"}
+    user_id = uuid.UUID(response_json["user"]["id"])
+
+    db_user = db_session.get(UserModel, user_id)
+    db_user.token_version += 1
+    db_session.commit()
+    invalidate_principal(user_id)
+
+    response = test_client.get("/api/v1/users/current-user", headers=headers)
+    assert response.status_code == 401
+
+
+def test_token_revoked_by_password_change(test_client):
+    response_json = sign_up(test_client)
+    headers = {"Authorization": f"Bearer {response_json['access_token']}"}
+
+    response = test_client.post(
+        "/api/v1/users/change-password",
+        json={"current_password": "password", "new_password": "new-password"},
+        headers=headers,
+    )
+    assert response.status_code == 204
+
+    response = test_client.get("/api/v1/users/current-user", headers=headers)
+    assert response.status_code == 401
+
+
+def test_sign_in_rehashes_outdated_password(test_client, db_session):
+    from passlib.hash import bcrypt
+
+    from app.models.user import User as UserModel
+
+    response_json = sign_up(test_client)
+    user_id = uuid.UUID(response_json["user"]["id"])
+    db_user = db_session.get(UserModel, user_id)
+    db_user.hashed_password = bcrypt.using(rounds=4).hash("password")
+    db_session.commit()
+
+    response = test_client.post(
+        "/api/v1/users/sign-in",
+        data={"username": db_user.username, "password": "password"},
+    )
+    assert response.status_code == 200
+
+    db_user = db_session.get(UserModel, user_id)
+    assert not db_user.hashed_password.startswith("$2b$04$")
+
+
+def test_sign_in_rejected_when_hasher_is_busy(test_client, monkeypatch):
+    from app.core import security
+
+    response_json = sign_up(test_client)
+    monkeypatch.setattr(security.password_hasher, "_slots", BoundedSemaphore(1))
+    security.password_hasher._slots.acquire()
+
+    response = test_client.post(
+        "/api/v1/users/sign-in",
+        data={"username": response_json["user"]["username"], "password": "password"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_saturated_hasher_leaves_the_threadpool_free(test_client, monkeypatch):
+    from anyio import to_thread
+
+    from app.core import security
+
+    response_json = sign_up(test_client)
+    headers = {"Authorization": f"Bearer {response_json['access_token']}"}
+    credentials = {
+        "username": response_json["user"]["username"],
+        "password": "password",
+    }
+
+    # A single hasher thread that stays busy until released
+    release = Event()
+    verify_and_update = security.pwd_context.verify_and_update
+
+    def slow_verify_and_update(*args):
+        release.wait(10)
+        return verify_and_update(*args)
+
+    hasher = security.PasswordHasher(max_workers=1, max_pending=8)
+    monkeypatch.setattr(security, "password_hasher", hasher)
+    monkeypatch.setattr(
+        security.pwd_context, "verify_and_update", slow_verify_and_update
+    )
+    # And a single request thread
+    limiter = test_client.portal.call(to_thread.current_default_thread_limiter)
+    total_tokens = limiter.total_tokens
+    test_client.portal.call(setattr, limiter, "total_tokens", 1)
+
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            sign_ins = []
+            for pending in range(1, 4):
+                sign_ins.append(
+                    pool.submit(
+                        test_client.post, "/api/v1/users/sign-in", data=credentials
+                    )
+                )
+                deadline = time.monotonic() + 10
+                while hasher.stats()["queued"] + hasher.stats()["running"] < pending:
+                    assert time.monotonic() < deadline
+                    time.sleep(0.01)
+
+            # Sync endpoints are still served while the sign ins wait on the
+            # hasher
+            response = pool.submit(
+                test_client.get, "/api/v1/users/current-user", headers=headers
+            ).result(timeout=10)
+            assert response.status_code == 200
+
+            release.set()
+            assert [sign_in.result(timeout=10).status_code for sign_in in sign_ins] == [
+                200
+            ] * 3
+    finally:
+        release.set()
+        test_client.portal.call(setattr, limiter, "total_tokens", total_tokens)
+
+
+def test_invalid_token_is_rejected(test_client):
+    response = test_client.get(
+        "/api/v1/users/current-user", headers={"Authorization": "Bearer invalid"}
+    )
+    assert response.status_code == 401
+
+
+def test_verification_email_goes_through_the_outbox(
+    test_client, db_session, dispatch_outbox, monkeypatch
+):
+    from app.core.outbox import handlers
+    from app.models.outbox import OutboxEvent
+
+    sent = []
+
+    async def send(payload):
+        sent.append(payload)
+
+    monkeypatch.setitem(handlers, "email.verify_email", send)
+    username = sign_up(test_client)["user"]["username"]
+
+    # Stored with the user, sent once dispatched
+    event = db_session.query(OutboxEvent).one()
+    assert event.topic == "email.verify_email"
+    assert sent == []
+    assert dispatch_outbox() == 1
+    assert [payload["name"] for payload in sent] == [username]
+
+    db_session.refresh(event)
+    assert event.processed_at is not None
+    assert event.attempts == 1
+    assert dispatch_outbox() == 0
+
+
+def test_failing_outbox_events_are_retried_then_failed(
+    test_client, db_session, dispatch_outbox, monkeypatch
+):
+    from app.core.outbox import handlers, outbox_dispatcher
+    from app.models.outbox import OutboxEvent
+
+    async def fail(payload):
+        raise ConnectionError("SMTP server unavailable")
+
+    monkeypatch.setitem(handlers, "email.verify_email", fail)
+    monkeypatch.setattr(outbox_dispatcher, "retry_delay", 0)
+    monkeypatch.setattr(outbox_dispatcher, "max_attempts", 2)
+    sign_up(test_client)
+
+    assert dispatch_outbox() == 1
+    event = db_session.query(OutboxEvent).one()
+    db_session.refresh(event)
+    assert event.failed_at is None
+    assert "SMTP server unavailable" in event.last_error
+
+    assert dispatch_outbox() == 1
+    db_session.refresh(event)
+    assert event.attempts == 2
+    assert event.failed_at is not None
+    assert event.processed_at is None
+    assert dispatch_outbox() == 0
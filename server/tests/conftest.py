@@ -1,15 +1,42 @@
+import os
 import uuid
+from contextlib import contextmanager
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import configure_mappers
 from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.functions import now
+from sqlalchemy_searchable import remove_listeners
 
+from app.db.pool import PoolMetrics, TimedQueuePool
 from app.db.session import Base, get_db
+from app.main import app, api_v1
 
-# SQLite database URL for testing
-SQLITE_DATABASE_URL = "sqlite:///./test_db.db"
+# The search triggers and functions installed by sqlalchemy-searchable are
+# PostgreSQL only, skip them when creating the SQLite schema
+configure_mappers()
+remove_listeners(Base.metadata)
+
+
+@compiles(TSVECTOR, "sqlite")
+def compile_tsvector(element, compiler, **kw):
+    return "TEXT"
+
+
+@compiles(now, "sqlite")
+def compile_now(element, compiler, **kw):
+    # CURRENT_TIMESTAMP has second precision and a different text format than
+    # the datetimes SQLAlchemy binds, which breaks (created_at, id) cursors
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+# In-memory SQLite database for testing, rebuilt from the models on every run
+SQLITE_DATABASE_URL = "sqlite://"
 
 # Create a SQLAlchemy engine
 engine = create_engine(
@@ -18,8 +45,27 @@ engine = create_engine(
     poolclass=StaticPool,
 )
 
-# Create a sessionmaker to manage sessions
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# pysqlite opens transactions lazily and ignores SAVEPOINTs inside them, let
+# SQLAlchemy emit BEGIN itself so the per test transaction really rolls back
+@event.listens_for(engine, "connect")
+def disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def begin_transaction(connection):
+    connection.exec_driver_sql("BEGIN")
+
+
+# Sessions bound to the test connection commit into a savepoint of its
+# transaction, so what requests commit is rolled back after every test
+TestingSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=engine,
+    join_transaction_mode="create_savepoint",
+)
 
 # Create tables in the database
 Base.metadata.create_all(bind=engine)
@@ -39,14 +85,82 @@ def db_session():
     connection.close()
 
 
+@pytest.fixture(scope="session")
+def postgres_url():
+    """
+    URL of a PostgreSQL database for the PostgreSQL only features, those
+    tests are skipped unless TEST_POSTGRES_URL is set.
+    """
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    return url
+
+
+@pytest.fixture
+def count_queries():
+    """Collects the statements sent to the test database within a `with` block."""
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            # Skip the savepoints the test sessions wrap their transactions in
+            if not statement.startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+                statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return counter
+
+
+@pytest.fixture
+def timed_engine(tmp_path, monkeypatch):
+    """A file backed engine on a small TimedQueuePool with its own metrics."""
+    monkeypatch.setattr(TimedQueuePool, "metrics", PoolMetrics())
+    timed = create_engine(
+        f"sqlite:///{tmp_path}/pool.db",
+        poolclass=TimedQueuePool,
+        pool_size=2,
+        max_overflow=1,
+        pool_timeout=0.05,
+    )
+    yield timed
+    timed.dispose()
+
+
+@pytest.fixture(autouse=True)
+def inline_media_pipeline(db_session, monkeypatch):
+    """Process uploaded media inline, against the test database session."""
+    from app.core.media_pipeline import media_pipeline
+
+    monkeypatch.setattr(media_pipeline, "max_workers", 0)
+    monkeypatch.setattr(
+        media_pipeline,
+        "session_factory",
+        lambda: TestingSessionLocal(bind=db_session.bind),
+    )
+
+
+@pytest.fixture(autouse=True)
+def empty_response_cache(monkeypatch):
+    """Start every test with an empty cache, the database is rolled back too."""
+    from app.core.cache import MemoryCacheBackend, response_cache
+
+    monkeypatch.setattr(response_cache, "backend", MemoryCacheBackend(1000))
+
+
 @pytest.fixture(scope="function")
 def test_client(db_session):
     """Create a test client that uses the override_get_db fixture to return a session."""
-    from app.main import app, api_v1
 
     def override_get_db():
         try:
-            Base.metadata.create_all(bind=engine)
             yield db_session
         finally:
             db_session.close()
@@ -54,3 +168,25 @@ def test_client(db_session):
     api_v1.dependency_overrides[get_db] = override_get_db
     with TestClient(app) as test_client:
         yield test_client
+
+
+@pytest.fixture(autouse=True)
+def manual_outbox(db_session, monkeypatch):
+    """Outbox events are dispatched on demand, against the test database session."""
+    from app.core.config import settings
+    from app.core.outbox import outbox_dispatcher
+
+    monkeypatch.setattr(settings, "outbox_dispatcher_enabled", False)
+    monkeypatch.setattr(
+        outbox_dispatcher,
+        "session_factory",
+        lambda: TestingSessionLocal(bind=db_session.bind),
+    )
+
+
+@pytest.fixture
+def dispatch_outbox(test_client):
+    """Dispatches one batch of due outbox events, returns how many there were."""
+    from app.core.outbox import outbox_dispatcher
+
+    return lambda: test_client.portal.call(outbox_dispatcher.dispatch)
@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy.exc import TimeoutError
+
+from app.db.pool import pool_stats
+
+
+def test_pool_stats(timed_engine):
+    connections = [timed_engine.connect() for _ in range(3)]
+    stats = pool_stats(timed_engine)
+    assert stats["pool_class"] == "TimedQueuePool"
+    assert stats["size"] == 2
+    assert stats["checked_out"] == 3
+    assert stats["idle"] == 0
+    assert stats["overflow"] == 1
+    assert stats["max_overflow"] == 1
+
+    # Every connection is taken, the next checkout waits for the timeout
+    with pytest.raises(TimeoutError):
+        timed_engine.connect()
+    stats = pool_stats(timed_engine)
+    assert stats["checkouts"] == 3
+    assert stats["timeouts"] == 1
+    assert stats["peak_checked_out"] == 3
+    assert stats["max_wait_ms"] >= 50
+    assert 0 < stats["avg_wait_ms"] <= stats["max_wait_ms"]
+
+    for connection in connections[:2]:
+        connection.close()
+    stats = pool_stats(timed_engine)
+    # Closed connections go back to the pool, the overflow one included
+    assert stats["checked_out"] == 1
+    assert stats["idle"] == 2
+    assert stats["overflow"] == 1
@@ -0,0 +1,92 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db import session
+
+
+def test_async_session_on_sqlite(monkeypatch, tmp_path):
+    monkeypatch.setattr(session.settings, "async_database_url", None)
+    monkeypatch.setattr(
+        session, "SQLALCHEMY_DATABASE_URL", f"sqlite:///{tmp_path}/app.db"
+    )
+    url = session.get_async_database_url()
+    assert url.startswith("sqlite+aiosqlite://")
+
+    async def query():
+        engine = create_async_engine(url)
+        monkeypatch.setattr(
+            session, "AsyncSessionLocal", async_sessionmaker(bind=engine)
+        )
+        async for db in session.get_async_db():
+            result = await db.scalar(text("SELECT 1"))
+        await engine.dispose()
+        return result
+
+    assert asyncio.run(query()) == 1
+
+
+def test_async_database_url_for_postgres(monkeypatch):
+    monkeypatch.setattr(session.settings, "async_database_url", None)
+    monkeypatch.setattr(
+        session, "SQLALCHEMY_DATABASE_URL", "postgresql://user:secret@db/app"
+    )
+    assert session.get_async_database_url() == "postgresql+asyncpg://user:secret@db/app"
+
+
+def test_async_read_paths_on_async_session(tmp_path):
+    from sqlalchemy import create_engine, select
+    from sqlalchemy.orm import Session
+
+    from app.api.dependencies import get_current_user
+    from app.core import security
+    from app.crud.service import SERVICE_SUMMARY_LOADERS, get_service_async
+    from app.models.service import PricingType, Service, ServiceTag
+    from app.models.user import User
+    from app.utils.pagination import paginate_async
+
+    url = f"sqlite:///{tmp_path}/app.db"
+    sync_engine = create_engine(url)
+    session.Base.metadata.create_all(sync_engine)
+    with Session(sync_engine, expire_on_commit=False) as db:
+        user = User(username="alice", email="alice@example.com", name="Alice")
+        service = Service(
+            title="Plumbing",
+            description="Leaks fixed",
+            category="home",
+            location="Lisbon",
+            pricing=20,
+            pricing_type=PricingType.hourly,
+            provider=user,
+            tags=[ServiceTag(text="pipes")],
+        )
+        db.add(service)
+        db.commit()
+    sync_engine.dispose()
+    token = security.create_access_token(data=security.access_token_claims(user))
+
+    async def read():
+        engine = create_async_engine(url.replace("sqlite", "sqlite+aiosqlite"))
+        async with async_sessionmaker(bind=engine)() as db:
+            # Everything the responses serialize is loaded eagerly, a lazy
+            # load would fail outside of the greenlet
+            detail = await get_service_async(db, service.id)
+            page = await paginate_async(
+                db,
+                select(Service).options(*SERVICE_SUMMARY_LOADERS),
+                Service,
+                None,
+                10,
+            )
+            current_user = await get_current_user(token, db)
+            result = (
+                detail.provider.username,
+                [tag.text for tag in detail.tags],
+                [item.id for item in page["items"]],
+                current_user.id,
+            )
+        await engine.dispose()
+        return result
+
+    assert asyncio.run(read()) == ("alice", ["pipes"], [service.id], user.id)